@@ -1,58 +1,218 @@
-from flask import Flask, Response, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
-import json
-import queue
 import os
+import tempfile
+import time
 import uuid
-import requests
-from collections import defaultdict
 from werkzeug.serving import WSGIRequestHandler
 
-app = Flask(__name__)
+from sse import encode_event, parse_event_id, HEARTBEAT_FRAME, OPEN_FRAME
+import room_clock
+from coalescer import StateCoalescer
+from heartbeat import HeartbeatScheduler
+from lifecycle import LifecycleManager
+from metrics import MetricsRegistry
+from models import new_listener_id
+from playlist import PlaylistEngine, playback_token
+from profiler import SamplingProfiler
+from ratelimit import ConcurrencyLimit, Overloaded, TokenBucketLimiter, retry_after_header
+from registry import RoomRegistry
+from room_store import create_room_store
+from search_cache import SearchCache
+from stream_cache import SONG_ID, StreamCache
+from song_projection import SongProjection
+from static_assets import StaticAsset
+from subscribers import ClientBuffer, POLICIES, STATE_EVENTS
+import upstream
+from upstream import CircuitBreaker, CircuitOpenError, UpstreamClient
+from wire import COMPRESSION_WBITS, SCHEMA_FRAME, StreamEncoder
+
+# static/ holds the web client, served precompressed by home() only
+app = Flask(__name__, static_folder=None)
 CORS(app)
 
-# Store rooms and queues
-rooms = {}
-room_queues = defaultdict(lambda: defaultdict(queue.Queue))
+# Instrumentation; METRICS_ENABLED=0 turns every metric into a no-op
+metrics = MetricsRegistry(enabled=os.environ.get('METRICS_ENABLED', '1') == '1')
+route_latency = metrics.histogram(
+    'http_request_duration_seconds', 'Flask route latency', ('route', 'method', 'status')
+)
+fanout_latency = metrics.histogram(
+    'broadcast_fanout_seconds', 'Time to queue one frame for every local subscriber', ('type',)
+)
+fanout_frames = metrics.counter(
+    'broadcast_frames_total', 'Frames queued for local SSE subscribers', ('type',)
+)
+sse_opened = metrics.counter('sse_connections_opened_total', 'SSE streams opened')
+sse_closed = metrics.counter('sse_connections_closed_total', 'SSE streams closed')
+search_latency = metrics.histogram(
+    'upstream_search_duration_seconds', 'Upstream song search latency', ('outcome',)
+)
+throttled = metrics.counter('requests_throttled_total', 'Requests turned away by rate limits', ('scope',))
+
+# Sampling profiler, toggled at runtime through /debug/profiler; the
+# endpoint only exists when PROFILER_TOKEN is set
+profiler = SamplingProfiler()
+profiler_token = os.environ.get('PROFILER_TOKEN')
+# Knowing a room id is enough to join and control the room, so stats list
+# rooms by id only for requests carrying X-Stats-Token = STATS_TOKEN
+stats_token = os.environ.get('STATS_TOKEN')
+
+# This process's SSE subscribers per room, plus each room's replay ring
+# (recent frames for Last-Event-ID resume), buffer stats and interned
+# track ids for the compact wire format, in lock-striped shards
+replay_buffer_size = int(os.environ.get('REPLAY_BUFFER_SIZE', 128))
+wire_max_tracks = int(os.environ.get('WIRE_MAX_TRACKS', 256))
+room_registry = RoomRegistry(
+    shards=int(os.environ.get('ROOM_REGISTRY_SHARDS', 64)),
+    ring_size=replay_buffer_size,
+    max_tracks=wire_max_tracks
+)
 
 # Get port from environment variable with a default of 10000
 port = int(os.environ.get('PORT', 10000))
 
+# The web client, served precompressed from memory. Browsers revalidate it
+# after CLIENT_PAGE_MAX_AGE seconds (a 304 when unchanged); shared caches
+# such as a CDN edge may keep it for CLIENT_PAGE_SHARED_MAX_AGE
+client_page = StaticAsset(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'index.html'))
+client_page_cache_control = 'public, max-age={}, s-maxage={}'.format(
+    int(os.environ.get('CLIENT_PAGE_MAX_AGE', 3600)),
+    int(os.environ.get('CLIENT_PAGE_SHARED_MAX_AGE', 86400))
+)
+
+# Per-client buffer size and what to do with a slow consumer once it fills:
+# drop_oldest, latest_state (collapse stale music_state) or disconnect
+queue_maxsize = int(os.environ.get('QUEUE_MAXSIZE', 64))
+queue_policy = os.environ.get('QUEUE_POLICY', 'latest_state')
+if queue_policy not in POLICIES:
+    raise ValueError(f'QUEUE_POLICY must be one of {", ".join(POLICIES)}')
+
+# Where room state lives and how broadcasts reach other worker processes:
+# memory (single process) or redis (any number of workers/nodes)
+room_backend = os.environ.get('ROOM_BACKEND', 'memory')
+redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+
+# Bursts of music_state updates within this window are merged before fan-out
+# (0 sends every update immediately)
+coalesce_window_ms = float(os.environ.get('COALESCE_WINDOW_MS', 50))
+
+# Upstream song search and the in-process cache in front of it
+saavn_search_url = os.environ.get('SAAVN_SEARCH_URL', 'https://saavn.dev/api/search/songs')
+search_cache = SearchCache(
+    maxsize=int(os.environ.get('SEARCH_CACHE_SIZE', 256)),
+    ttl=float(os.environ.get('SEARCH_CACHE_TTL', 300)),
+    max_bytes=int(os.environ.get('SEARCH_CACHE_MAX_BYTES', 8 * 1024 * 1024))
+)
+# Per-stream compression of /events (gzip, deflate or off), used when the
+# client's Accept-Encoding allows it
+sse_compression = os.environ.get('SSE_COMPRESSION', 'off')
+if sse_compression != 'off' and sse_compression not in COMPRESSION_WBITS:
+    raise ValueError(f'SSE_COMPRESSION must be one of off, {", ".join(COMPRESSION_WBITS)}')
+
+# Token buckets (requests per second, burst) per client address for room
+# mutations and searches, and per room for anything that broadcasts
+rate_limit_enabled = os.environ.get('RATE_LIMIT_ENABLED', '1') == '1'
+# Key clients by the first X-Forwarded-For hop; only safe behind a proxy
+# that sets it
+rate_limit_forwarded = os.environ.get('RATE_LIMIT_FORWARDED', '0') == '1'
+client_limiter = TokenBucketLimiter(
+    rate=float(os.environ.get('CLIENT_RATE_LIMIT', 10)),
+    burst=int(os.environ.get('CLIENT_RATE_BURST', 20))
+)
+room_limiter = TokenBucketLimiter(
+    rate=float(os.environ.get('ROOM_RATE_LIMIT', 5)),
+    burst=int(os.environ.get('ROOM_RATE_BURST', 15))
+)
+search_limiter = TokenBucketLimiter(
+    rate=float(os.environ.get('SEARCH_RATE_LIMIT', 2)),
+    burst=int(os.environ.get('SEARCH_RATE_BURST', 10))
+)
+# Node-wide admission control (0 = unlimited): upstream searches in flight
+# and open SSE streams
+search_slots = ConcurrencyLimit(int(os.environ.get('MAX_UPSTREAM_SEARCHES', 20)))
+sse_slots = ConcurrencyLimit(int(os.environ.get('MAX_SSE_CONNECTIONS', 10000)))
+
+# Idle streams get a keepalive comment every HEARTBEAT_INTERVAL seconds,
+# sent in batches by one scheduler that wakes every HEARTBEAT_TICK seconds
+heartbeat_interval = float(os.environ.get('HEARTBEAT_INTERVAL', 30))
+heartbeat_tick = float(os.environ.get('HEARTBEAT_TICK', 1))
+
+# Room play queues: the next entry is resolved and announced this many
+# seconds before the current track ends
+playlist_prefetch_lead = float(os.environ.get('PLAYLIST_PREFETCH_LEAD', 15))
+playlist_max_length = int(os.environ.get('PLAYLIST_MAX_LENGTH', 200))
+# Threads running advances and prefetches, which may search upstream
+playlist_workers = int(os.environ.get('PLAYLIST_WORKERS', 4))
+
+# Rooms with no open streams and no activity for this long are deleted;
+# subscribers with frames nobody has drained for this long are reaped
+room_idle_ttl = float(os.environ.get('ROOM_IDLE_TTL', 3600))
+# Shared store keys outlive the local deadline a little, so a room whose
+# streams are still open is refreshed before Redis can drop it
+room_store_ttl = room_idle_ttl + min(room_idle_ttl, 60)
+subscriber_stall_timeout = float(os.environ.get('SUBSCRIBER_STALL_TIMEOUT', 90))
+
+# Quality preferences for the projected search results, best first
+song_projection = SongProjection(
+    bitrates=os.environ.get('PREFERRED_BITRATES', '320kbps,160kbps,96kbps,48kbps,12kbps').split(','),
+    image_sizes=os.environ.get('PREFERRED_IMAGE_SIZES', '500x500,150x150,50x50').split(','),
+    # Incremental parsing (needs ijson): flat memory per search, more CPU
+    streaming=os.environ.get('SEARCH_STREAM_PARSE', '0') == '1'
+)
+upstream_client = UpstreamClient(
+    pool_size=int(os.environ.get('UPSTREAM_POOL_SIZE', 20)),
+    retries=int(os.environ.get('UPSTREAM_RETRIES', 2)),
+    timeout=float(os.environ.get('UPSTREAM_TIMEOUT', 10)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('UPSTREAM_BREAKER_THRESHOLD', 5)),
+        reset_timeout=float(os.environ.get('UPSTREAM_BREAKER_RESET', 30))
+    )
+)
+
+# Optional /stream/<song_id> relay: each track is downloaded from the CDN
+# once and served to every listener from a size-capped disk cache
+stream_relay = os.environ.get('STREAM_RELAY', '0') == '1'
+stream_cache = StreamCache(
+    directory=os.environ.get('STREAM_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'broadcast-music-streams')),
+    max_bytes=int(os.environ.get('STREAM_CACHE_MAX_BYTES', 1024 * 1024 * 1024))
+) if stream_relay else None
+# Audio downloads get their own pool and breaker so a slow CDN cannot trip
+# song search
+stream_client = UpstreamClient(
+    pool_size=int(os.environ.get('UPSTREAM_POOL_SIZE', 20)),
+    retries=int(os.environ.get('UPSTREAM_RETRIES', 2)),
+    timeout=float(os.environ.get('UPSTREAM_TIMEOUT', 10)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('UPSTREAM_BREAKER_THRESHOLD', 5)),
+        reset_timeout=float(os.environ.get('UPSTREAM_BREAKER_RESET', 30))
+    )
+) if stream_relay else None
+
 def fetch_song_data(query):
+    if not search_slots.try_acquire():
+        raise Overloaded(1)
+    start = time.perf_counter()
+    outcome = 'error'
     try:
-        url = f'https://saavn.dev/api/search/songs?query={query}'
-        response = requests.get(url, timeout=10)
+        response = upstream_client.get(saavn_search_url, params={'query': query}, stream=True)
         
-        if response.status_code == 200:
-            data = response.json()
-            
-            if data.get("success"):
-                songs = []
-                for song in data['data']['results']:
-                    song_data = {
-                        'id': song.get('id'),
-                        'title': song.get('name'),
-                        'mp3_url': None,
-                        'thumbnail_url': None,
-                        'artist': song.get('primaryArtists', 'Unknown Artist')
-                    }
-                    if song.get('downloadUrl'):
-                        for download in song['downloadUrl']:
-                            if download.get('quality') == '320kbps':
-                                song_data['mp3_url'] = download.get('url')
-                                break
-                    
-                    if song.get('image'):
-                        for image in song['image']:
-                            if image.get('quality') == '500x500':
-                                song_data['thumbnail_url'] = image.get('url')
-                                break
-                        
-                    songs.append(song_data)
-                return songs
-            return {"error": "No results found"}
-    except requests.RequestException as e:
+        with response:
+            if response.status_code == 200:
+                songs = song_projection.parse(response)
+                if songs is not None:
+                    outcome = 'ok'
+                    return songs
+                return {"error": "No results found"}
+    except CircuitOpenError:
+        outcome = 'rejected'
+        raise
+    except upstream.RequestException as e:
         return {"error": f"Failed to fetch data: {str(e)}"}
+    except ValueError:
+        return {"error": "Invalid response from song service"}
+    finally:
+        search_slots.release()
+        search_latency.observe(time.perf_counter() - start, outcome)
     return {"error": "Unknown error occurred"}
 
 @app.route('/songs', methods=['GET'])
@@ -62,412 +222,146 @@ def get_songs():
     if not query:
         return jsonify({"error": "No song name provided"}), 400
     
-    songs = fetch_song_data(query)
+    try:
+        songs = search_cache.get_or_fetch(query, fetch_song_data)
+    except (CircuitOpenError, Overloaded) as e:
+        # Upstream is down or saturated: serve whatever we last had instead
+        # of waiting on it
+        songs = search_cache.get_stale(query)
+        if songs is None:
+            return (
+                jsonify({"error": "Song search is temporarily unavailable"}),
+                503,
+                {'Retry-After': str(int(e.retry_after))}
+            )
     if isinstance(songs, dict) and "error" in songs:
         return jsonify(songs), 400
+    if stream_cache is not None:
+        stream_cache.remember(songs)
+        songs = [
+            dict(song, stream_url=f"/stream/{song['id']}") if song.get('id') and song.get('mp3_url') else song
+            for song in songs
+        ]
     return jsonify(songs)
 
+@app.route('/stats/songs')
+def songs_stats():
+    return jsonify(dict(search_cache.stats(), upstream=upstream_client.stats()))
+
+def download_track(url, fileobj):
+    response = stream_client.get(url, stream=True)
+    with response:
+        response.raise_for_status()
+        for chunk in response.iter_content(64 * 1024):
+            fileobj.write(chunk)
+
+@app.route('/stream/<song_id>')
+def stream_song(song_id):
+    if stream_cache is None or not SONG_ID.match(song_id):
+        return jsonify({"error": "Not found"}), 404
+    # A file can be evicted between lookup and open; fetch it again once
+    for attempt in range(2):
+        try:
+            path = stream_cache.get_or_fetch(song_id, download_track)
+        except KeyError:
+            return jsonify({"error": "Unknown song"}), 404
+        except CircuitOpenError as e:
+            return (
+                jsonify({"error": "Audio relay is temporarily unavailable"}),
+                503,
+                {'Retry-After': str(int(e.retry_after))}
+            )
+        except upstream.RequestException as e:
+            return jsonify({"error": f"Failed to fetch audio: {str(e)}"}), 502
+        try:
+            # Range and conditional requests are answered from the file;
+            # without a Range the server's file_wrapper (sendfile) is used
+            return send_file(path, conditional=True, max_age=86400)
+        except FileNotFoundError:
+            if attempt:
+                raise
+
+@app.route('/stats/streams')
+def streams_stats():
+    if stream_cache is None:
+        return jsonify({'enabled': False})
+    return jsonify(dict(stream_cache.stats(), enabled=True, upstream=stream_client.stats()))
+
 @app.route('/')
 def home():
-    return """
-    <html>
-        <head>
-            <title>Music Broadcast</title>
-            <link href="https://cdn.jsdelivr.net/npm/tailwindcss@2.2.19/dist/tailwind.min.css" rel="stylesheet">
-            <style>
-                .gradient-bg {
-                    background: linear-gradient(135deg, #1e3a8a, #1e40af);
-                }
-                .glass-effect {
-                    background: rgba(255, 255, 255, 0.1);
-                    backdrop-filter: blur(10px);
-                    border-radius: 10px;
-                    border: 1px solid rgba(255, 255, 255, 0.2);
-                }
-                .input-style {
-                    background: rgba(255, 255, 255, 0.1);
-                    border: 1px solid rgba(255, 255, 255, 0.2);
-                }
-                .btn-primary {
-                    background: #3b82f6;
-                    color: white;
-                }
-                .btn-primary:hover {
-                    background: #2563eb;
-                }
-                .btn-secondary {
-                    background: #4f46e5;
-                    color: white;
-                }
-                .btn-secondary:hover {
-                    background: #4338ca;
-                }
-                .song-item {
-                    transition: all 0.3s ease;
-                }
-                .song-item:hover {
-                    transform: translateX(5px);
-                    background: rgba(255, 255, 255, 0.1);
-                }
-            </style>
-        </head>
-        <body class="gradient-bg min-h-screen text-white font-sans">
-            <div class="container mx-auto px-4 py-8 max-w-3xl">
-                <div class="glass-effect rounded-xl p-8 shadow-2xl">
-                    <h1 class="text-4xl font-bold text-center mb-8 bg-clip-text text-transparent bg-gradient-to-r from-green-400 to-blue-500">
-                        Music Broadcast
-                    </h1>
-                    
-                    <!-- Message Display -->
-                    <div id="message" class="hidden mb-6 p-4 rounded-lg text-center"></div>
-                    
-                    <!-- Room Controls -->
-                    <div id="controls" class="space-y-4">
-                        <div class="space-y-2">
-                            <label class="block text-sm font-medium text-gray-300">Create or Join Room</label>
-                            <div class="flex space-x-2">
-                                <input type="text" id="roomId" placeholder="Enter Room ID" 
-                                    class="flex-1 px-4 py-2 rounded-lg input-style text-white">
-                                <input type="text" id="username" placeholder="Your Name" 
-                                    class="flex-1 px-4 py-2 rounded-lg input-style text-white">
-                                <button onclick="createRoom()" 
-                                    class="btn-primary px-6 py-2 rounded-lg font-semibold">
-                                    Create Room
-                                </button>
-                                <button onclick="joinRoom()" 
-                                    class="btn-secondary px-6 py-2 rounded-lg font-semibold">
-                                    Join Room
-                                </button>
-                            </div>
-                        </div>
-                    </div>
-                    
-                    <!-- Music Controls (Hidden by Default) -->
-                    <div id="musicControls" class="hidden space-y-6 mt-8">
-                        <div class="space-y-2">
-                            <label class="block text-sm font-medium text-gray-300">Search Songs</label>
-                            <div class="flex space-x-2">
-                                <input type="text" id="searchQuery" placeholder="Enter song name" 
-                                    class="flex-1 px-4 py-2 rounded-lg input-style text-white">
-                                <button onclick="searchSongs()" 
-                                    class="btn-primary px-6 py-2 rounded-lg font-semibold">
-                                    Search
-                                </button>
-                            </div>
-                        </div>
-                        
-                        <!-- Search Results -->
-                        <div id="searchResults" class="hidden space-y-2">
-                            <h3 class="text-xl font-semibold mb-3">Search Results</h3>
-                            <div id="songsList" class="space-y-2 max-h-60 overflow-y-auto"></div>
-                        </div>
-                        
-                        <!-- Audio Player -->
-                        <div class="mt-6">
-                            <audio id="audio" controls class="w-full"></audio>
-                        </div>
-                        
-                        <!-- Play/Pause Button -->
-                        <div class="grid grid-cols-2 gap-4">
-                            <button onclick="togglePlay()" id="playPauseBtn"
-                                class="btn-secondary px-6 py-3 rounded-lg font-semibold">
-                                Play
-                            </button>
-                        </div>
-                        
-                        <!-- Now Playing -->
-                        <div id="nowPlaying" class="hidden mt-4 p-4 glass-effect rounded-lg">
-                            <h3 class="text-lg font-semibold mb-2">Now Playing</h3>
-                            <div id="currentSong" class="text-gray-300"></div>
-                        </div>
-                        
-                        <!-- Connected Users -->
-                        <div id="users" class="mt-6">
-                            <h3 class="text-xl font-semibold mb-3">Connected Users</h3>
-                            <ul id="userList" class="list-disc list-inside text-gray-300"></ul>
-                        </div>
-                    </div>
-                </div>
-            </div>
-            
-            <script>
-                let isPlaying = false;
-                let currentRoom = '';
-                
-                // Show message to the user
-                function showMessage(message, isError = false) {
-                    const messageDiv = document.getElementById('message');
-                    messageDiv.textContent = message;
-                    messageDiv.className = isError ? 'bg-red-500' : 'bg-green-500';
-                    messageDiv.classList.remove('hidden');
-                    setTimeout(() => messageDiv.classList.add('hidden'), 3000);
-                }
-                
-                // Create a new room
-                async function createRoom() {
-                    const roomId = document.getElementById('roomId').value;
-                    const username = document.getElementById('username').value;
-                    
-                    if (!roomId || !username) {
-                        showMessage('Please enter a room ID and username', true);
-                        return;
-                    }
-                    
-                    try {
-                        const response = await fetch('/create-room', {
-                            method: 'POST',
-                            headers: {'Content-Type': 'application/json'},
-                            body: JSON.stringify({ roomId, username })
-                        });
-                        
-                        const data = await response.json();
-                        if (data.success) {
-                            currentRoom = roomId;
-                            document.getElementById('controls').style.display = 'none';
-                            document.getElementById('musicControls').style.display = 'block';
-                            connectToEvents();
-                            showMessage('Room created successfully!');
-                        } else {
-                            showMessage(data.message || 'Failed to create room', true);
-                        }
-                    } catch (error) {
-                        showMessage('Error creating room', true);
-                    }
-                }
-                
-                // Join an existing room
-                async function joinRoom() {
-                    const roomId = document.getElementById('roomId').value;
-                    const username = document.getElementById('username').value;
-                    
-                    if (!roomId || !username) {
-                        showMessage('Please enter a room ID and username', true);
-                        return;
-                    }
-                    
-                    try {
-                        const response = await fetch('/join-room', {
-                            method: 'POST',
-                            headers: {'Content-Type': 'application/json'},
-                            body: JSON.stringify({ roomId, username })
-                        });
-                        
-                        const data = await response.json();
-                        if (data.success) {
-                            currentRoom = roomId;
-                            document.getElementById('controls').style.display = 'none';
-                            document.getElementById('musicControls').style.display = 'block';
-                            connectToEvents();
-                            showMessage('Joined room successfully!');
-                        } else {
-                            showMessage(data.message || 'Failed to join room', true);
-                        }
-                    } catch (error) {
-                        showMessage('Error joining room', true);
-                    }
-                }
-                
-                // Search for songs
-                async function searchSongs() {
-                    const query = document.getElementById('searchQuery').value;
-                    if (!query) {
-                        showMessage('Please enter a song name', true);
-                        return;
-                    }
-                    
-                    try {
-                        const response = await fetch(`/songs?query=${encodeURIComponent(query)}`);
-                        const songs = await response.json();
-                        
-                        if (response.ok) {
-                            displaySearchResults(songs);
-                        } else {
-                            showMessage(songs.error || 'Failed to search songs', true);
-                        }
-                    } catch (error) {
-                        showMessage('Error searching songs', true);
-                    }
-                }
-                
-                // Display search results
-                function displaySearchResults(songs) {
-                    const songsList = document.getElementById('songsList');
-                    const searchResults = document.getElementById('searchResults');
-                    
-                    songsList.innerHTML = songs.map(song => `
-                        <div class="song-item p-3 rounded-lg glass-effect cursor-pointer" 
-                             onclick="selectSong('${song.mp3_url}', '${song.title}', '${song.artist}')">
-                            <div class="font-medium">${song.title}</div>
-                            <div class="text-sm text-gray-400">${song.artist}</div>
-                        </div>
-                    `).join('');
-                    
-                    searchResults.style.display = 'block';
-                }
-                
-                // Select a song to play
-                async function selectSong(url, title, artist) {
-                    if (!url) {
-                        showMessage('No playable URL for this song', true);
-                        return;
-                    }
-                    
-                    try {
-                        const response = await fetch('/set-music', {
-                            method: 'POST',
-                            headers: {'Content-Type': 'application/json'},
-                            body: JSON.stringify({
-                                roomId: currentRoom,
-                                track: url,
-                                title: title,
-                                artist: artist
-                            })
-                        });
-                        
-                        if ((await response.json()).success) {
-                            document.getElementById('currentSong').innerHTML = `
-                                <div class="font-medium">${title}</div>
-                                <div class="text-sm">${artist}</div>
-                            `;
-                            document.getElementById('nowPlaying').style.display = 'block';
-                            showMessage('Music updated successfully!');
-                        }
-                    } catch (error) {
-                        showMessage('Error setting music', true);
-                    }
-                }
-                
-                // Toggle play/pause
-                function togglePlay() {
-                    const audio = document.getElementById('audio');
-                    isPlaying = !isPlaying;
-                    audio[isPlaying ? 'play' : 'pause']();
-                    document.getElementById('playPauseBtn').textContent = isPlaying ? 'Pause' : 'Play';
-                    
-                    fetch('/play-pause', {
-                        method: 'POST',
-                        headers: {'Content-Type': 'application/json'},
-                        body: JSON.stringify({
-                            roomId: currentRoom,
-                            isPlaying: isPlaying,
-                            currentTime: audio.currentTime
-                        })
-                    });
-                }
-                
-                // Connect to Server-Sent Events (SSE)
-                function connectToEvents() {
-                    const events = new EventSource(`/events?roomId=${currentRoom}`);
-                    
-                    events.onmessage = (event) => {
-                        const data = JSON.parse(event.data);
-                        
-                        if (data.type === 'music_state') {
-                            const audio = document.getElementById('audio');
-                            const playPauseBtn = document.getElementById('playPauseBtn');
-                            const nowPlaying = document.getElementById('nowPlaying');
-                            
-                            audio.src = data.data.track;
-                            audio.currentTime = data.data.currentTime;
-                            
-                            if (data.data.title && data.data.artist) {
-                                document.getElementById('currentSong').innerHTML = `
-                                    <div class="font-medium">${data.data.title}</div>
-                                    <div class="text-sm">${data.data.artist}</div>
-                                `;
-                                nowPlaying.style.display = 'block';
-                            }
-                            
-                            if (data.data.isPlaying) {
-                                audio.play();
-                                isPlaying = true;
-                                playPauseBtn.textContent = 'Pause';
-                            } else {
-                                audio.pause();
-                                isPlaying = false;
-                                playPauseBtn.textContent = 'Play';
-                            }
-                        } else if (data.type === 'user_joined') {
-                            showMessage(`${data.data.username} joined the room!`);
-                            if (data.data.users) {
-                                updateUserList(data.data.users);
-                            }
-                        }
-                    };
-                    
-                    events.onerror = () => {
-                        showMessage('Connection lost. Reconnecting...', true);
-                    };
-                }
-                
-                // Update the list of connected users
-                function updateUserList(users) {
-                    const userList = document.getElementById('userList');
-                    userList.innerHTML = users.map(user => `<li>${user}</li>`).join('');
-                }
-            </script>
-        </body>
-    </html>
-    """
+    etag, encoding, body = client_page.select(lambda encoding: request.accept_encodings[encoding])
+    headers = {'ETag': f'W/"{etag}"', 'Cache-Control': client_page_cache_control, 'Vary': 'Accept-Encoding'}
+    if request.if_none_match.contains_weak(etag):
+        return Response(status=304, headers=headers)
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+    return Response(body, mimetype='text/html', headers=headers)
 
 @app.route('/create-room', methods=['POST'])
 def create_room():
     data = request.json
     room_id = data['roomId']
-    username = data.get('username', 'Anonymous')
     
-    if room_id not in rooms:
-        rooms[room_id] = {
-            'track': '',
-            'isPlaying': False,
-            'currentTime': 0,
-            'users': [username]
-        }
-        return jsonify({'success': True})
+    if room_store.create_room(room_id, dict(room_clock.anchor(0, False), track='')):
+        touch_room(room_id)
+        return jsonify({'success': True, 'listenerId': new_listener_id()})
     return jsonify({'success': False, 'message': 'Room already exists'})
 
 @app.route('/join-room', methods=['POST'])
 def join_room():
     data = request.json
     room_id = data['roomId']
-    username = data.get('username', 'Anonymous')
     
-    if room_id in rooms:
-        rooms[room_id]['users'].append(username)
-        broadcast_to_room(room_id, {
-            'type': 'user_joined',
-            'data': {
-                'username': username,
-                'users': rooms[room_id]['users']
-            }
-        })
-        return jsonify({'success': True})
+    # Joining only issues the id; the listener enters the roster with its
+    # first /events stream and leaves it with its last
+    if room_store.room_exists(room_id):
+        touch_room(room_id)
+        return jsonify({'success': True, 'listenerId': new_listener_id()})
     return jsonify({'success': False})
 
+@app.route('/room-users')
+def room_users():
+    room_id = request.args.get('roomId')
+    offset = max(request.args.get('offset', 0, type=int), 0)
+    limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+    
+    page = room_store.roster(room_id, offset, limit)
+    if page is None:
+        return jsonify({'error': 'Room not found'}), 404
+    total, users = page
+    return jsonify({'total': total, 'offset': offset, 'users': users})
+
+def announce_join(room_id, listener_id, username, count):
+    touch_room(room_id)
+    # Membership changes go out as single-user deltas; the full list is paged
+    # from /room-users
+    broadcast_to_room(room_id, {
+        'type': 'user_joined',
+        'data': {'listenerId': listener_id, 'username': username, 'count': count}
+    })
+
+def announce_leave(room_id, listener_id, username, count):
+    broadcast_to_room(room_id, {
+        'type': 'user_left',
+        'data': {'listenerId': listener_id, 'username': username, 'count': count}
+    })
+
 @app.route('/set-music', methods=['POST'])
 def set_music():
     data = request.json
     room_id = data['roomId']
     
-    if room_id in rooms:
-        rooms[room_id].update({
-            'track': data['track'],
-            'title': data.get('title'),
-            'artist': data.get('artist'),
-            'isPlaying': False,
-            'currentTime': 0
-        })
-        
-        broadcast_to_room(room_id, {
-            'type': 'music_state',
-            'data': {
-                'track': data['track'],
-                'title': data.get('title'),
-                'artist': data.get('artist'),
-                'isPlaying': False,
-                'currentTime': 0
-            }
-        })
+    room = room_store.update_room(room_id, dict(
+        room_clock.anchor(0, False),
+        track=data['track'],
+        title=data.get('title'),
+        artist=data.get('artist'),
+        duration=data.get('duration')
+    ))
+    if room is not None:
+        touch_room(room_id)
+        playlist.schedule(room_id, room)
+        broadcast_to_room(room_id, music_state_message(room))
         return jsonify({'success': True})
     return jsonify({'success': False})
 
@@ -476,65 +370,589 @@ def play_pause():
     data = request.json
     room_id = data['roomId']
     
-    if room_id in rooms:
-        rooms[room_id]['isPlaying'] = data['isPlaying']
-        rooms[room_id]['currentTime'] = data['currentTime']
-        
-        broadcast_to_room(room_id, {
-            'type': 'music_state',
-            'data': {
-                'track': rooms[room_id]['track'],
-                'isPlaying': data['isPlaying'],
-                'currentTime': data['currentTime']
-            }
-        })
+    # The controller's position at the moment of the toggle becomes the new
+    # anchor; everyone else derives their position from the server clock
+    room = room_store.update_room(room_id, room_clock.anchor(
+        data['currentTime'],
+        data['isPlaying'],
+        rate=data.get('playbackRate', 1.0)
+    ))
+    if room is not None:
+        touch_room(room_id)
+        playlist.schedule(room_id, room)
+        broadcast_to_room(room_id, music_state_message(room))
         return jsonify({'success': True})
     return jsonify({'success': False})
 
+def queue_entry(data):
+    # A queue entry is either resolved (has a track URL, e.g. picked from
+    # search results) or a query that is resolved when it comes up next
+    entry = {'id': uuid.uuid4().hex[:12], 'query': data.get('query')}
+    if data.get('track'):
+        entry.update(
+            track=data['track'],
+            songId=data.get('songId'),
+            title=data.get('title'),
+            artist=data.get('artist'),
+            thumbnail=data.get('thumbnail'),
+            duration=data.get('duration')
+        )
+    return entry
+
+def resolve_entry(entry):
+    # Fills in track, artist, thumbnail and duration for a query-only entry
+    # through the search cache; None if the search comes back empty
+    if entry.get('track'):
+        return entry
+    try:
+        songs = search_cache.get_or_fetch(entry['query'], fetch_song_data)
+    except (CircuitOpenError, Overloaded):
+        songs = search_cache.get_stale(entry['query'])
+    if not isinstance(songs, list):
+        return None
+    matches = [song for song in songs if song.get('mp3_url')]
+    if entry.get('songId'):
+        matches = [song for song in matches if song['id'] == entry['songId']] or matches
+    if not matches:
+        return None
+    song = matches[0]
+    track = song['mp3_url']
+    if stream_cache is not None:
+        stream_cache.remember([song])
+        track = f"/stream/{song['id']}"
+    return dict(
+        entry,
+        track=track,
+        songId=song['id'],
+        title=song['title'],
+        artist=song['artist'],
+        thumbnail=song.get('thumbnail_url'),
+        duration=song.get('duration')
+    )
+
+def queue_message(room):
+    return {'type': 'queue_updated', 'data': {'queue': room.get('queue') or []}}
+
+def modify_queue(room_id, change):
+    # change(queue) returns the new list, or None to leave it alone
+    def apply(room):
+        queue = change(list(room.get('queue') or []))
+        return None if queue is None else {'queue': queue}
+
+    room = room_store.modify_room(room_id, apply)
+    if room is not None:
+        touch_room(room_id)
+        playlist.schedule(room_id, room)
+        broadcast_to_room(room_id, queue_message(room))
+    return room
+
+def advance_room(room_id, token=None):
+    # Starts the next queued entry. With a token (auto-advance) nothing
+    # happens unless the room is still in that stretch of playback, so only
+    # one worker advances a room shared through Redis.
+    room = room_store.get_room(room_id)
+    if room is None or not room.get('queue'):
+        return False
+    head = room['queue'][0]
+    resolved = resolve_entry(head)
+
+    def apply(room):
+        if token is not None and playback_token(room) != token:
+            return None
+        queue = room.get('queue') or []
+        if not queue or queue[0]['id'] != head['id']:
+            return None
+        if resolved is None:
+            # Unplayable; drop it and let the next advance try the one after
+            return {'queue': queue[1:]}
+        return dict(
+            room_clock.anchor(0, True),
+            track=resolved['track'],
+            title=resolved.get('title'),
+            artist=resolved.get('artist'),
+            duration=resolved.get('duration'),
+            queue=queue[1:]
+        )
+
+    room = room_store.modify_room(room_id, apply)
+    if room is None:
+        return False
+    # Playback moving on by itself is room activity like any control
+    touch_room(room_id)
+    playlist.schedule(room_id, room)
+    broadcast_to_room(room_id, queue_message(room))
+    if resolved is None:
+        return advance_room(room_id)
+    broadcast_to_room(room_id, music_state_message(room))
+    return True
+
+def prefetch_next(room_id, token):
+    # Resolves the next entry ahead of time and tells listeners about it so
+    # they can start buffering before the switch instead of all at once
+    room = room_store.get_room(room_id)
+    if room is None or playback_token(room) != token or not room.get('queue'):
+        return
+    head = room['queue'][0]
+    resolved = resolve_entry(head)
+    if resolved is None:
+        return
+    if resolved is not head:
+        def apply(room):
+            queue = room.get('queue') or []
+            if not queue or queue[0]['id'] != head['id']:
+                return None
+            return {'queue': [resolved] + queue[1:]}
+        if room_store.modify_room(room_id, apply) is not None:
+            touch_room(room_id)
+    if stream_cache is not None and resolved.get('songId') and resolved['track'].startswith('/stream/'):
+        try:
+            stream_cache.get_or_fetch(resolved['songId'], download_track)
+        except (KeyError, CircuitOpenError, upstream.RequestException, OSError):
+            pass
+    broadcast_to_room(room_id, {
+        'type': 'next_track',
+        'data': dict(resolved, startsAt=round(room_clock.ends_at(room), 3))
+    })
+
+@app.route('/queue')
+def get_queue():
+    room = room_store.get_room(request.args.get('roomId'))
+    if room is None:
+        return jsonify({'error': 'Room not found'}), 404
+    return jsonify({'queue': room.get('queue') or []})
+
+@app.route('/queue/add', methods=['POST'])
+def queue_add():
+    data = request.json
+    room_id = data['roomId']
+    if not data.get('track') and not data.get('query'):
+        return jsonify({'success': False, 'error': 'track or query is required'}), 400
+    entry = queue_entry(data)
+
+    def append(queue):
+        if len(queue) >= playlist_max_length:
+            return None
+        return queue + [entry]
+
+    room = modify_queue(room_id, append)
+    if room is None:
+        return jsonify({'success': False})
+    # Nothing playing, or the last track already ran out: start right away
+    ends_at = room_clock.ends_at(room)
+    if not room['track'] or (ends_at is not None and ends_at <= room_clock.server_time()):
+        advance_room(room_id)
+    return jsonify({'success': True, 'entryId': entry['id']})
+
+@app.route('/queue/move', methods=['POST'])
+def queue_move():
+    data = request.json
+
+    def move(queue):
+        ids = [entry['id'] for entry in queue]
+        if data['entryId'] not in ids:
+            return None
+        entry = queue.pop(ids.index(data['entryId']))
+        queue.insert(max(0, int(data['position'])), entry)
+        return queue
+
+    return jsonify({'success': modify_queue(data['roomId'], move) is not None})
+
+@app.route('/queue/remove', methods=['POST'])
+def queue_remove():
+    data = request.json
+
+    def remove(queue):
+        remaining = [entry for entry in queue if entry['id'] != data['entryId']]
+        return remaining if len(remaining) != len(queue) else None
+
+    return jsonify({'success': modify_queue(data['roomId'], remove) is not None})
+
+@app.route('/queue/skip', methods=['POST'])
+def queue_skip():
+    room_id = request.json['roomId']
+    advanced = advance_room(room_id)
+    if advanced:
+        touch_room(room_id)
+    return jsonify({'success': advanced})
+
+def music_state_message(room):
+    now = room_clock.server_time()
+    return {
+        'type': 'music_state',
+        'data': {
+            'track': room['track'],
+            'title': room.get('title'),
+            'artist': room.get('artist'),
+            'duration': room.get('duration'),
+            'isPlaying': room['isPlaying'],
+            'currentTime': round(room_clock.position(room, now), 3),
+            'playbackRate': room.get('playbackRate', 1.0),
+            'serverTime': round(now, 3)
+        }
+    }
+
+@app.route('/time')
+def server_time():
+    # Clock sync: clients estimate their offset from the round trip
+    return jsonify({'serverTime': round(room_clock.server_time(), 4)}), 200, {'Cache-Control': 'no-store'}
+
 @app.route('/events')
 def events():
     room_id = request.args.get('roomId')
     client_id = request.args.get('clientId', str(uuid.uuid4()))
+    listener_id = request.args.get('listenerId')
+    username = request.args.get('username', 'Anonymous')
+    # EventSource sends Last-Event-ID by itself when it reconnects
+    last_event_id = parse_event_id(
+        request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    )
+    
+    compact = request.args.get('format') == 'compact'
+    compression = None
+    if sse_compression != 'off' and request.accept_encodings[sse_compression]:
+        compression = sse_compression
     
-    if room_id not in rooms:
+    if not room_store.room_exists(room_id):
         return jsonify({'error': 'Room not found'}), 404
+    if not sse_slots.try_acquire():
+        throttled.inc('sse')
+        return jsonify({'error': 'Too many connections'}), 503, retry_after_header(5)
 
     def generate():
-        client_queue = room_queues[room_id][client_id]
+        sse_opened.inc()
+        # The same client reconnecting replaces its old, dead stream
+        local, client_queue, missed, resume_id = room_registry.subscribe(
+            room_id, client_id,
+            lambda stats: ClientBuffer(queue_maxsize, queue_policy, stats, compact=compact),
+            last_event_id
+        )
+        stats = local.stats
+        # JSON streams without compression pass the shared frames straight through
+        stream = StreamEncoder(compression) if compact or compression else None
+        encoder = local.encoder if compact else None
+        touch_room(room_id)
+        lifecycle.watch_subscriber(room_id, client_id, client_queue)
+        heartbeats.register(client_queue)
+        if listener_id:
+            # Open streams are counted per listener in the room store, shared
+            # by every worker, so a reconnect overlapping the old stream's
+            # teardown (here or on another worker) does not count as leaving.
+            # A count means this stream put the listener on the roster
+            count = room_store.open_stream(room_id, listener_id, username)
+            if count is not None:
+                announce_join(room_id, listener_id, username, count)
         try:
+            opening = [OPEN_FRAME, SCHEMA_FRAME] if compact else [OPEN_FRAME]
+            if missed is not None:
+                stats.replayed += len(missed)
+                opening.extend(missed)
+            else:
+                # New listeners, and reconnects that fell too far behind,
+                # start from a snapshot of the current position instead
+                if last_event_id is not None:
+                    stats.resyncs += 1
+                current = room_store.get_room(room_id)
+                if current is not None and current['track']:
+                    opening.append(encode_event(music_state_message(current), resume_id))
+            for frame in opening:
+                if encoder is not None:
+                    frame = encoder.encode(frame)
+                yield frame if stream is None else stream.encode(frame)
             while True:
-                try:
-                    message = client_queue.get(timeout=30)
-                    yield f"data: {json.dumps(message)}\n\n"
-                except queue.Empty:
-                    yield f"data: {json.dumps({'type': 'ping'})}\n\n"
-        except GeneratorExit:
-            if client_id in room_queues[room_id]:
-                del room_queues[room_id][client_id]
-            if not room_queues[room_id]:
-                del room_queues[room_id]
-
-    return Response(
-        generate(),
-        mimetype='text/event-stream',
-        headers={
-            'Cache-Control': 'no-cache',
-            'Connection': 'keep-alive',
-            'X-Accel-Buffering': 'no'
-        }
-    )
+                # Keepalives arrive through the queue from the heartbeat
+                # scheduler, so there is no per-stream timer to arm
+                frame = client_queue.get()
+                if frame is not None:
+                    yield frame if stream is None else stream.encode(frame)
+                elif client_queue.closed:
+                    break
+        finally:
+            client_queue.close()
+            sse_closed.inc()
+            room_registry.unsubscribe(room_id, client_id, client_queue)
+            if room_store.room_exists(room_id):
+                touch_room(room_id)
+            if listener_id:
+                # Leaves the roster only with the listener's last stream
+                removed = room_store.close_stream(room_id, listener_id)
+                if removed is not None:
+                    announce_leave(room_id, listener_id, *removed)
+
+    headers = {
+        'Cache-Control': 'no-cache',
+        'Connection': 'keep-alive',
+        'X-Accel-Buffering': 'no'
+    }
+    if sse_compression != 'off':
+        headers['Vary'] = 'Accept-Encoding'
+    if compression is not None:
+        headers['Content-Encoding'] = compression
+    response = Response(generate(), mimetype='text/event-stream', headers=headers)
+    # Runs even if the client goes away before the generator starts
+    response.call_on_close(sse_slots.release)
+    return response
 
 def broadcast_to_room(room_id, message):
-    if room_id in room_queues:
-        dead_clients = []
-        for client_id, client_queue in room_queues[room_id].items():
-            try:
-                client_queue.put_nowait(message)
-            except queue.Full:
-                dead_clients.append(client_id)
-        
-        for client_id in dead_clients:
-            del room_queues[room_id][client_id]
+    kind = message.get('type')
+    if state_coalescer is not None:
+        if kind in STATE_EVENTS:
+            state_coalescer.submit(room_id, message)
+            return
+        # Anything else must not overtake a state update still being held
+        state_coalescer.flush_room(room_id)
+    publish_to_room(room_id, message)
+
+def publish_to_room(room_id, message):
+    # Encode once, every subscriber in every worker gets the same frame; the
+    # store stamps the event id on it
+    room_store.publish_event(room_id, message.get('type'), encode_event(message))
+
+def deliver_to_room(room_id, event_id, kind, frame):
+    local = room_registry.get(room_id)
+    if local is None:
+        # With Redis every worker hears every room's broadcasts; local state
+        # for a room nobody here is listening to still has to expire
+        local = room_registry.get_or_create(room_id)
+        lifecycle.touch_room(room_id)
+    start = time.perf_counter()
+    dead_clients = []
+    with local.fanout_lock:
+        # A snapshot: subscribers joining or leaving meanwhile swap in a new
+        # dict instead of waiting for this loop
+        subscribers = local.record(event_id, frame)
+        if subscribers:
+            fanout_frames.inc(kind, amount=len(subscribers))
+        compact = None
+        for client_id, client_queue in subscribers.items():
+            if client_queue.compact:
+                # Derived once per event, only if someone asked for it
+                if compact is None:
+                    compact = local.encoder.encode(frame)
+                delivered = client_queue.put(kind, compact)
+            else:
+                delivered = client_queue.put(kind, frame)
+            if not delivered:
+                dead_clients.append((client_id, client_queue))
+    for client_id, client_queue in dead_clients:
+        room_registry.unsubscribe(room_id, client_id, client_queue)
+    fanout_latency.observe(time.perf_counter() - start, kind)
+
+def touch_room(room_id):
+    lifecycle.touch_room(room_id)
+    room_store.touch_room(room_id, room_store_ttl)
+
+def expire_room(room_id):
+    # Lifecycle callback: drop an idle room unless streams are still open.
+    # Open streams keep it alive in the shared store too; the lifecycle
+    # pushes its own deadline out when this returns False
+    if not room_registry.discard(room_id):
+        room_store.touch_room(room_id, room_store_ttl)
+        return False
+    playlist.forget_room(room_id)
+    room_store.delete_room(room_id)
+    return True
+
+def reap_subscriber(room_id, client_id, client_queue):
+    # Lifecycle callback: stop feeding a client that has stopped reading; its
+    # generator wakes up, ends and runs the normal disconnect cleanup
+    client_queue.close()
+    room_registry.unsubscribe(room_id, client_id, client_queue)
+
+@app.route('/stats/rooms')
+def rooms_stats():
+    # Totals for this process; the per-room breakdown only with the token
+    totals = {'rooms': 0}
+    by_room = {}
+    for local in room_registry.rooms():
+        subscribers = list(local.subscribers.values())
+        stats = dict(
+            local.stats.as_dict(),
+            subscribers=len(subscribers),
+            queue_depth=sum(len(client_queue) for client_queue in subscribers),
+            replay_buffered=len(local.ring)
+        )
+        for key, value in stats.items():
+            totals[key] = max(totals.get(key, 0), value) if key == 'max_depth' else totals.get(key, 0) + value
+        totals['rooms'] += 1
+        by_room[local.room_id] = stats
+    if stats_token and request.headers.get('X-Stats-Token') == stats_token:
+        totals['by_room'] = by_room
+    return jsonify(totals)
+
+@app.route('/stats/registry')
+def registry_stats():
+    return jsonify(room_registry.stats())
+
+@app.route('/stats/playlist')
+def playlist_stats():
+    return jsonify(playlist.stats())
+
+@app.route('/stats/admission')
+def admission_stats():
+    return jsonify({
+        'rate_limit_enabled': rate_limit_enabled,
+        'client': client_limiter.stats(),
+        'room': room_limiter.stats(),
+        'search': search_limiter.stats(),
+        'upstream_searches': search_slots.stats(),
+        'sse_connections': sse_slots.stats(),
+    })
+
+@app.route('/stats/lifecycle')
+def lifecycle_stats():
+    return jsonify(lifecycle.stats())
+
+@app.route('/stats/heartbeats')
+def heartbeats_stats():
+    return jsonify(heartbeats.stats())
+
+@app.route('/stats/broadcasts')
+def broadcasts_stats():
+    return jsonify(state_coalescer.stats() if state_coalescer is not None else {'window_ms': 0})
+
+@app.before_request
+def start_request_timer():
+    request.environ['app.start_time'] = time.perf_counter()
+
+# Endpoints behind the per-client bucket; True if they also spend a token
+# from the room's bucket because they broadcast to it
+MUTATION_ENDPOINTS = {
+    'create_room': False,
+    'join_room': False,
+    'set_music': True,
+    'play_pause': True,
+    'queue_add': True,
+    'queue_move': True,
+    'queue_remove': True,
+    'queue_skip': True,
+}
+
+def client_address():
+    if rate_limit_forwarded:
+        forwarded = request.headers.get('X-Forwarded-For')
+        if forwarded:
+            return forwarded.split(',')[0].strip()
+    return request.remote_addr
+
+@app.before_request
+def admit_request():
+    if not rate_limit_enabled:
+        return None
+    endpoint = request.endpoint
+    if endpoint == 'get_songs':
+        scope, wait = 'search', search_limiter.acquire(client_address())
+    elif endpoint in MUTATION_ENDPOINTS:
+        scope, wait = 'client', client_limiter.acquire(client_address())
+        if not wait and MUTATION_ENDPOINTS[endpoint]:
+            room_id = (request.get_json(silent=True) or {}).get('roomId')
+            if room_id:
+                scope, wait = 'room', room_limiter.acquire(room_id)
+    else:
+        return None
+    if wait:
+        throttled.inc(scope)
+        return jsonify({'error': 'Too many requests'}), 429, retry_after_header(wait)
+    return None
+
+@app.after_request
+def record_request_time(response):
+    start = request.environ.get('app.start_time')
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        route_latency.observe(time.perf_counter() - start, route, request.method, response.status_code)
+    return response
+
+# Node-wide only: a room label would publish every room id (enough to join
+# and control a room) and one series per room per metric
+def collect_room_gauge(field):
+    def collect():
+        total = 0
+        for local in room_registry.rooms():
+            subscribers = local.subscribers.values()
+            if field == 'subscribers':
+                total += len(subscribers)
+            else:
+                total += sum(len(client_queue) for client_queue in subscribers)
+        return [((), total)]
+    return collect
+
+def collect_buffer_stat(field):
+    return lambda: [((), getattr(room_registry.buffer_totals(), field))]
+
+metrics.callback('sse_open_connections', 'Open SSE streams in this process', (),
+                 collect_room_gauge('subscribers'))
+metrics.callback('sse_queue_depth', 'Frames waiting in subscriber buffers', (),
+                 collect_room_gauge('depth'))
+for field, documentation in (
+    ('drops', 'Frames dropped from full subscriber buffers'),
+    ('collapsed', 'Stale music_state frames collapsed'),
+    ('evictions', 'Slow subscribers disconnected'),
+    ('replayed', 'Frames replayed to resuming subscribers'),
+    ('resyncs', 'Resuming subscribers sent a snapshot instead'),
+):
+    metrics.callback(f'sse_buffer_{field}_total', documentation, (), collect_buffer_stat(field), 'counter')
+for field, documentation in (
+    ('hits', 'Search cache hits'),
+    ('misses', 'Search cache misses'),
+    ('coalesced', 'Searches that waited on an in-flight upstream call'),
+    ('evictions', 'Search cache evictions'),
+    ('stale_hits', 'Stale results served while the upstream was unavailable'),
+):
+    metrics.callback(f'search_cache_{field}_total', documentation, (),
+                     lambda field=field: [((), getattr(search_cache, field))], 'counter')
+metrics.callback('search_cache_bytes', 'Approximate size of cached search results', (),
+                 lambda: [((), search_cache.stats()['bytes'])])
+for field, documentation in (
+    ('hits', 'Audio relay cache hits'),
+    ('misses', 'Audio relay cache misses'),
+    ('coalesced', 'Audio relay misses that joined an in-flight download'),
+    ('evictions', 'Audio files evicted from the relay cache'),
+    ('download_bytes', 'Bytes downloaded from the audio CDN'),
+):
+    metrics.callback(f'stream_cache_{field}_total', documentation, (),
+                     lambda field=field: [((), getattr(stream_cache, field))] if stream_cache else [], 'counter')
+metrics.callback('stream_cache_bytes', 'Size of the audio relay cache on disk', (),
+                 lambda: [((), stream_cache.stats()['bytes'])] if stream_cache else [])
+metrics.callback('rooms_expired_total', 'Idle rooms deleted', (),
+                 lambda: [((), lifecycle.rooms_expired)], 'counter')
+metrics.callback('subscribers_reaped_total', 'Stalled subscribers reaped', (),
+                 lambda: [((), lifecycle.subscribers_reaped)], 'counter')
+metrics.callback('sse_heartbeats_total', 'Keepalive frames queued for idle streams', (),
+                 lambda: [((), heartbeats.sent)], 'counter')
+metrics.callback('upstream_searches_in_flight', 'Upstream searches holding an admission slot', (),
+                 lambda: [((), search_slots.active)])
+metrics.callback('admission_rejected_total', 'Work turned away by node-wide limits', ('limit',),
+                 lambda: [(('upstream_searches',), search_slots.rejected), (('sse_connections',), sse_slots.rejected)],
+                 'counter')
+metrics.callback('upstream_circuit_open', 'Whether the upstream circuit breaker is open', (),
+                 lambda: [((), int(upstream_client.breaker.state != 'closed'))])
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/debug/profiler', methods=['GET', 'POST'])
+def profiler_control():
+    if not profiler_token or request.headers.get('X-Profiler-Token') != profiler_token:
+        return jsonify({'error': 'Not found'}), 404
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+        if data.get('reset'):
+            profiler.reset()
+        if data.get('enabled'):
+            profiler.start(data.get('interval'))
+        elif 'enabled' in data:
+            profiler.stop()
+        return jsonify({'running': profiler.running, 'interval': profiler.interval, 'samples': profiler.samples})
+    # Folded stacks, one per line, for flamegraph.pl / speedscope
+    return Response(profiler.folded(), mimetype='text/plain')
+
+heartbeats = HeartbeatScheduler(heartbeat_interval, heartbeat_tick, HEARTBEAT_FRAME)
+playlist = PlaylistEngine(playlist_prefetch_lead, advance_room, prefetch_next, playlist_workers)
+lifecycle = LifecycleManager(room_idle_ttl, subscriber_stall_timeout, expire_room, reap_subscriber)
+# Last: with Redis, deliveries start arriving as soon as it subscribes
+room_store = create_room_store(room_backend, deliver_to_room, redis_url=redis_url)
+state_coalescer = StateCoalescer(coalesce_window_ms / 1000, publish_to_room) if coalesce_window_ms > 0 else None
 
 if __name__ == '__main__':
     WSGIRequestHandler.protocol_version = "HTTP/1.1"
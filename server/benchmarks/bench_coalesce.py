@@ -0,0 +1,100 @@
+"""Replays a play/pause + seek burst trace against a large room.
+
+For each coalescing window, reports how many music_state frames reach the
+listeners, total egress bytes, and checks that every listener ends on the
+final state.
+
+    python benchmarks/bench_coalesce.py --listeners 5000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from coalescer import StateCoalescer  # noqa: E402
+from sse import encode_event  # noqa: E402
+from subscribers import BufferStats, ClientBuffer  # noqa: E402
+
+WINDOWS_MS = [0, 20, 50, 100]
+
+
+def burst_trace(events, seed=7):
+    # A few users mashing play/pause and scrubbing: mostly 5-40ms apart with
+    # occasional pauses between bursts
+    rng = random.Random(seed)
+    trace, position, playing = [], 0.0, False
+    for i in range(events):
+        gap = rng.uniform(0.005, 0.04) if rng.random() < 0.9 else rng.uniform(0.15, 0.3)
+        if rng.random() < 0.5:
+            playing = not playing
+        else:
+            position = max(0.0, position + rng.uniform(-15, 15))
+        trace.append((gap, {
+            'type': 'music_state',
+            'data': {'track': 'https://aac.saavncdn.com/123/abcdef_320.mp4', 'title': 'Song',
+                     'artist': 'Artist', 'isPlaying': playing, 'currentTime': round(position, 3), 'seq': i},
+        }))
+    return trace
+
+
+def run(window_ms, listeners, trace):
+    stats = BufferStats()
+    buffers = [ClientBuffer(len(trace) + 1, 'drop_oldest', stats) for _ in range(listeners)]
+    egress = [0]
+
+    def send(room_id, message):
+        frame = encode_event(message)
+        egress[0] += len(frame) * len(buffers)
+        for client_buffer in buffers:
+            client_buffer.put('music_state', frame)
+
+    coalescer = StateCoalescer(window_ms / 1000, send) if window_ms else None
+    start = time.perf_counter()
+    for gap, message in trace:
+        time.sleep(gap)
+        if coalescer is None:
+            send('bench', message)
+        else:
+            coalescer.submit('bench', message)
+    time.sleep(window_ms / 1000 * 2 + 0.05)
+    elapsed = time.perf_counter() - start
+    if coalescer is not None:
+        coalescer.close()
+
+    final = encode_event(trace[-1][1])
+    last_frames = set()
+    for client_buffer in buffers:
+        frame = None
+        while len(client_buffer):
+            frame = client_buffer.get(0)
+        last_frames.add(frame)
+    return {
+        'window_ms': window_ms,
+        'frames_per_listener': stats.delivered // listeners,
+        'frames_total': stats.delivered,
+        'egress_mb': round(egress[0] / 2 ** 20, 2),
+        'egress_mb_per_s': round(egress[0] / 2 ** 20 / elapsed, 2),
+        'final_state_delivered': last_frames == {final},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listeners', type=int, default=5000)
+    parser.add_argument('--events', type=int, default=300)
+    args = parser.parse_args()
+
+    trace = burst_trace(args.events)
+    print(json.dumps({
+        'listeners': args.listeners,
+        'trace_events': len(trace),
+        'results': [run(window, args.listeners, trace) for window in WINDOWS_MS],
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
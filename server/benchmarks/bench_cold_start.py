@@ -0,0 +1,166 @@
+"""Cold start and time to first byte of the web client page.
+
+  import       fresh interpreters running `import app`: whole-process wall
+               time and the import alone, and whether requests got loaded
+  first byte   spawns `python app.py` and polls GET / until it answers:
+               spawn to first byte, and the first request on its own
+  page         warm GET / latency and bytes on the wire with no
+               compression, gzip and br accepted, and a conditional GET
+               with the ETag
+
+--server-dir points at another checkout, e.g. a git worktree of an older
+commit, to compare against it.
+
+    python benchmarks/bench_cold_start.py [--runs 10] [--server-dir DIR]
+"""
+import argparse
+import http.client
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+IMPORT_SNIPPET = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+print(json.dumps({"import_ms": (time.perf_counter() - start) * 1000, "requests_loaded": "requests" in sys.modules}))
+'''
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_env(**extra):
+    return dict(os.environ, RATE_LIMIT_ENABLED='0', **extra)
+
+
+def import_run(server_dir, runs):
+    wall, imports, loaded = [], [], set()
+    for _ in range(runs):
+        start = time.perf_counter()
+        output = subprocess.check_output(
+            [sys.executable, '-c', IMPORT_SNIPPET], cwd=server_dir, env=server_env(), stderr=subprocess.DEVNULL
+        )
+        wall.append((time.perf_counter() - start) * 1000)
+        result = json.loads(output.splitlines()[-1])
+        imports.append(result['import_ms'])
+        loaded.add(result['requests_loaded'])
+    return {
+        'process_ms_median': round(statistics.median(wall), 1),
+        'import_ms_median': round(statistics.median(imports), 1),
+        'import_ms_min': round(min(imports), 1),
+        'requests_loaded_at_import': sorted(loaded),
+    }
+
+
+def get(conn, headers=None):
+    start = time.perf_counter()
+    conn.request('GET', '/', headers=headers or {})
+    response = conn.getresponse()
+    first_byte = time.perf_counter() - start
+    body = response.read()
+    return response, body, first_byte
+
+
+def first_byte_run(server_dir, runs):
+    spawn, first_request = [], []
+    for _ in range(runs):
+        port = free_port()
+        start = time.perf_counter()
+        process = subprocess.Popen(
+            [sys.executable, 'app.py'], cwd=server_dir, env=server_env(PORT=str(port)),
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            while True:
+                try:
+                    conn = http.client.HTTPConnection('127.0.0.1', port)
+                    conn.connect()
+                    break
+                except ConnectionRefusedError:
+                    time.sleep(0.002)
+            _, _, first_byte = get(conn, {'Accept-Encoding': 'gzip, br'})
+            spawn.append((time.perf_counter() - start) * 1000)
+            first_request.append(first_byte * 1000)
+            conn.close()
+        finally:
+            process.terminate()
+            process.wait()
+    return {
+        'spawn_to_first_byte_ms_median': round(statistics.median(spawn), 1),
+        'first_request_ms_median': round(statistics.median(first_request), 2),
+    }
+
+
+def page_run(server_dir, rounds):
+    port = free_port()
+    process = subprocess.Popen(
+        [sys.executable, 'app.py'], cwd=server_dir, env=server_env(PORT=str(port)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        while True:
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', port)
+                conn.connect()
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.01)
+        report = {}
+        etag = None
+        for name, accept in (('identity', 'identity'), ('gzip', 'gzip'), ('gzip_br', 'gzip, br')):
+            times = []
+            for _ in range(rounds):
+                response, body, first_byte = get(conn, {'Accept-Encoding': accept})
+                times.append(first_byte * 1000)
+            etag = response.getheader('ETag')
+            report[name] = {
+                'bytes': len(body),
+                'content_encoding': response.getheader('Content-Encoding'),
+                'first_byte_ms_p50': round(statistics.median(times), 3),
+            }
+        if etag:
+            times = []
+            for _ in range(rounds):
+                response, body, first_byte = get(conn, {'Accept-Encoding': 'gzip, br', 'If-None-Match': etag})
+                times.append(first_byte * 1000)
+            report['conditional'] = {
+                'status': response.status,
+                'bytes': len(body),
+                'first_byte_ms_p50': round(statistics.median(times), 3),
+            }
+        report['cache_control'] = response.getheader('Cache-Control')
+        conn.close()
+        return report
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--runs', type=int, default=10, help='fresh processes per cold-start measurement')
+    parser.add_argument('--rounds', type=int, default=200, help='warm requests per page variant')
+    parser.add_argument('--server-dir', default=SERVER_DIR)
+    args = parser.parse_args()
+
+    server_dir = os.path.abspath(args.server_dir)
+    print(json.dumps({
+        'server_dir': server_dir,
+        'import': import_run(server_dir, args.runs),
+        'first_byte': first_byte_run(server_dir, args.runs),
+        'page': page_run(server_dir, args.rounds),
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Fan-out cost per broadcast message as listeners per room grow.
+
+Compares the old path (every subscriber gets the dict and runs its own
+json.dumps) with the shared pre-encoded frame path used by
+broadcast_to_room.
+
+    python benchmarks/bench_fanout.py
+"""
+import json
+import os
+import queue
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sse import encode_event  # noqa: E402
+
+LISTENER_COUNTS = [1, 10, 100, 1000, 10000]
+MESSAGE = {
+    'type': 'music_state',
+    'data': {
+        'track': 'https://aac.saavncdn.com/123/abcdef0123456789_320.mp4',
+        'title': 'Aaj Ki Raat',
+        'artist': 'Madhubanti Bagchi, Divya Kumar',
+        'isPlaying': True,
+        'currentTime': 42.5,
+    },
+}
+
+
+def per_client_encode(queues, message):
+    for client_queue in queues:
+        client_queue.put_nowait(message)
+    for client_queue in queues:
+        f"data: {json.dumps(client_queue.get_nowait())}\n\n".encode('utf-8')
+
+
+def shared_frame(queues, message):
+    frame = encode_event(message)
+    for client_queue in queues:
+        client_queue.put_nowait(frame)
+    for client_queue in queues:
+        client_queue.get_nowait()
+
+
+def measure(fn, listeners, rounds):
+    queues = [queue.Queue() for _ in range(listeners)]
+    fn(queues, MESSAGE)
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(queues, MESSAGE)
+    return (time.perf_counter() - start) / rounds
+
+
+def main():
+    print(f"{'listeners':>10} {'per-client us':>15} {'shared us':>12} {'speedup':>8}")
+    for listeners in LISTENER_COUNTS:
+        rounds = max(5, 20000 // listeners)
+        old = measure(per_client_encode, listeners, rounds)
+        new = measure(shared_frame, listeners, rounds)
+        print(f"{listeners:>10} {old * 1e6:>15.1f} {new * 1e6:>12.1f} {old / new:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
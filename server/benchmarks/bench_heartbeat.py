@@ -0,0 +1,141 @@
+"""Compares per-stream timed waits against the central heartbeat scheduler.
+
+Opens N subscriber workers on ClientBuffers, drives a light broadcast load
+at a fraction of them and leaves the rest idle, then reports CPU time,
+context switches and keepalives sent for both keepalive strategies:
+
+  timeout    every stream waits with get(timeout=interval) and pings itself
+  scheduler  streams block on get() and one HeartbeatScheduler thread
+             queues the shared comment frame for the idle ones
+
+Run with --gevent to measure under the gevent hub (greenlets and libev
+timers) the way gevent_server.py serves.
+
+    python benchmarks/bench_heartbeat.py --streams 2000 --interval 1
+"""
+import argparse
+import sys
+
+if '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import json  # noqa: E402
+import os  # noqa: E402
+import threading  # noqa: E402
+import time  # noqa: E402
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from heartbeat import HeartbeatScheduler  # noqa: E402
+from sse import HEARTBEAT_FRAME, encode_event  # noqa: E402
+from subscribers import BufferStats, ClientBuffer  # noqa: E402
+
+
+def ctx_switches():
+    # Summed over every thread of the process, voluntary and involuntary
+    total = 0
+    for task in os.listdir('/proc/self/task'):
+        try:
+            with open('/proc/self/task/%s/status' % task) as status:
+                for line in status:
+                    if 'ctxt_switches' in line:
+                        total += int(line.split(':')[1])
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def run(mode, streams, active_share, interval, tick, duration, rate):
+    stats = BufferStats()
+    buffers = [ClientBuffer(64, 'latest_state', stats) for _ in range(streams)]
+    wakeups = [0] * streams
+    pings = [0] * streams
+
+    def timed_worker(i, client_buffer):
+        while True:
+            frame = client_buffer.get(timeout=interval)
+            wakeups[i] += 1
+            if frame is None:
+                if client_buffer.closed:
+                    return
+                pings[i] += 1
+
+    def blocking_worker(i, client_buffer):
+        while True:
+            frame = client_buffer.get()
+            wakeups[i] += 1
+            if frame is None and client_buffer.closed:
+                return
+            if frame is HEARTBEAT_FRAME:
+                pings[i] += 1
+
+    scheduler = None
+    if mode == 'scheduler':
+        scheduler = HeartbeatScheduler(interval, tick, HEARTBEAT_FRAME)
+        worker = blocking_worker
+    else:
+        worker = timed_worker
+    threads = []
+    for i, client_buffer in enumerate(buffers):
+        if scheduler is not None:
+            scheduler.register(client_buffer)
+        thread = threading.Thread(target=worker, args=(i, client_buffer), daemon=True)
+        thread.start()
+        threads.append(thread)
+
+    active = buffers[:int(streams * active_share)]
+    frame = encode_event({'type': 'music_state', 'data': {'isPlaying': True, 'currentTime': 1.0}})
+    cpu_start, ctx_start = time.process_time(), ctx_switches()
+    deadline = time.monotonic() + duration
+    sent = 0
+    while time.monotonic() < deadline:
+        for client_buffer in active:
+            client_buffer.put('music_state', frame)
+        sent += 1
+        time.sleep(1 / rate)
+    cpu = time.process_time() - cpu_start
+    ctx = ctx_switches() - ctx_start
+
+    for client_buffer in buffers:
+        client_buffer.close()
+    if scheduler is not None:
+        scheduler.close()
+    for thread in threads:
+        thread.join(5)
+    return {
+        'mode': mode,
+        'cpu_s': round(cpu, 3),
+        'ctx_switches': ctx,
+        'wakeups': sum(wakeups),
+        'keepalives': sum(pings),
+        'broadcasts': sent,
+        'delivered': stats.delivered,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--streams', type=int, default=2000)
+    parser.add_argument('--active-share', type=float, default=0.1)
+    parser.add_argument('--interval', type=float, default=1.0)
+    parser.add_argument('--tick', type=float, default=0.1)
+    parser.add_argument('--duration', type=float, default=10.0)
+    parser.add_argument('--rate', type=float, default=2.0, help='broadcasts per second to active streams')
+    parser.add_argument('--gevent', action='store_true')
+    args = parser.parse_args()
+
+    results = [run(mode, args.streams, args.active_share, args.interval, args.tick, args.duration, args.rate)
+               for mode in ('timeout', 'scheduler')]
+    print(json.dumps({
+        'streams': args.streams,
+        'active_share': args.active_share,
+        'interval_s': args.interval,
+        'duration_s': args.duration,
+        'gevent': args.gevent,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""Parse time and peak memory per search for the /songs projection.
+
+Compares the old full decode + Python walk, SongProjection over a full
+decode, and SongProjection over the ijson event stream, on the fixture
+payload (saavn.dev search shape) and a scaled-up synthetic one.
+
+    python benchmarks/bench_projection.py
+"""
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_upstream import make_payload  # noqa: E402
+from song_projection import SongProjection  # noqa: E402
+
+FIXTURE = os.path.join(os.path.dirname(__file__), 'fixtures', 'search_stree2.json')
+projection = SongProjection(
+    ['320kbps', '160kbps', '96kbps', '48kbps', '12kbps'],
+    ['500x500', '150x150', '50x50']
+)
+
+
+def legacy(body):
+    data = json.loads(body)
+    songs = []
+    for song in data['data']['results']:
+        song_data = {
+            'id': song.get('id'),
+            'title': song.get('name'),
+            'mp3_url': None,
+            'thumbnail_url': None,
+            'artist': song.get('primaryArtists', 'Unknown Artist')
+        }
+        for download in song.get('downloadUrl') or []:
+            if download.get('quality') == '320kbps':
+                song_data['mp3_url'] = download.get('url')
+                break
+        for image in song.get('image') or []:
+            if image.get('quality') == '500x500':
+                song_data['thumbnail_url'] = image.get('url')
+                break
+        songs.append(song_data)
+    return songs
+
+
+def full_decode(body):
+    return projection.parse_bytes(body)
+
+
+def streaming(body):
+    # Feed in 8 KiB chunks, as response.raw would
+    return projection.parse_stream(io.BufferedReader(io.BytesIO(body), 8192))
+
+
+def measure(fn, body, rounds):
+    fn(body)
+    best = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(body)
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    fn(body)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'parse_us': round(best * 1e6, 1), 'peak_kb': round(peak / 1024, 1)}
+
+
+def main():
+    with open(FIXTURE, 'rb') as f:
+        fixture = f.read()
+    payloads = {
+        'fixture_10_results': fixture,
+        'synthetic_100_results': json.dumps(make_payload('Stree2', 100)).encode(),
+    }
+    report = {}
+    for name, body in payloads.items():
+        report[name] = {'bytes': len(body)}
+        for label, fn in (('legacy', legacy), ('full_decode', full_decode), ('streaming', streaming)):
+            report[name][label] = measure(fn, body, 50)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
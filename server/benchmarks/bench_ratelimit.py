@@ -0,0 +1,130 @@
+"""Overhead of rate limiting and admission control.
+
+Reports ns per token-bucket acquire (one thread, and 8 threads on distinct
+or shared keys), ns per concurrency slot acquire/release, per-request
+latency of /play-pause and a cached /songs lookup with
+RATE_LIMIT_ENABLED=1 versus 0 (limits set high enough never to trigger,
+each in a fresh interpreter since the flag is read at import), and what a
+single client hammering /play-pause gets back with the default limits.
+
+    python benchmarks/bench_ratelimit.py
+"""
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import timeit
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, SERVER_DIR)
+
+
+def micro():
+    from ratelimit import ConcurrencyLimit, TokenBucketLimiter
+
+    rounds = 200000
+    limiter = TokenBucketLimiter(rate=1e9, burst=10 ** 9)
+    keys = [f'10.0.{i // 256}.{i % 256}' for i in range(10000)]
+    key_iter = iter(keys * (rounds // len(keys) + 1))
+    result = {
+        'acquire_same_key_ns': round(
+            timeit.timeit(lambda: limiter.acquire('127.0.0.1'), number=rounds) / rounds * 1e9, 1),
+        'acquire_10k_keys_ns': round(
+            timeit.timeit(lambda: limiter.acquire(next(key_iter)), number=rounds) / rounds * 1e9, 1),
+    }
+    slots = ConcurrencyLimit(100)
+
+    def slot():
+        slots.try_acquire()
+        slots.release()
+
+    result['slot_acquire_release_ns'] = round(timeit.timeit(slot, number=rounds) / rounds * 1e9, 1)
+
+    for name, shared in (('threads8_distinct_keys_ns', False), ('threads8_shared_key_ns', True)):
+        per_thread = rounds // 8
+
+        def worker(i):
+            key = 'shared' if shared else f'client{i}'
+            for _ in range(per_thread):
+                limiter.acquire(key)
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        result[name] = round((time.perf_counter() - start) / (per_thread * 8) * 1e9, 1)
+    return result
+
+
+def requests_run(rounds=3000):
+    import app as server
+
+    client = server.app.test_client()
+    client.post('/create-room', json={'roomId': 'bench', 'username': 'host'})
+    server.search_cache._store('bench', [{'id': '1', 'title': 't', 'mp3_url': 'u', 'artist': 'a'}])
+
+    def play_pause():
+        client.post('/play-pause', json={'roomId': 'bench', 'isPlaying': True, 'currentTime': 1})
+
+    def search():
+        client.get('/songs?query=bench')
+
+    result = {}
+    for name, fn in (('play_pause_us', play_pause), ('songs_cached_us', search)):
+        fn()
+        result[name] = round(min(timeit.repeat(fn, number=rounds, repeat=5)) / rounds * 1e6, 2)
+    return result
+
+
+def flood_run(requests=200):
+    # Default limits: one client sending /play-pause as fast as it can
+    import app as server
+
+    client = server.app.test_client()
+    client.post('/create-room', json={'roomId': 'flood', 'username': 'host'})
+    statuses, retry_after = {}, set()
+    start = time.perf_counter()
+    for _ in range(requests):
+        resp = client.post('/play-pause', json={'roomId': 'flood', 'isPlaying': True, 'currentTime': 1})
+        statuses[resp.status_code] = statuses.get(resp.status_code, 0) + 1
+        if 'Retry-After' in resp.headers:
+            retry_after.add(resp.headers['Retry-After'])
+    return {
+        'requests': requests,
+        'seconds': round(time.perf_counter() - start, 3),
+        'statuses': statuses,
+        'retry_after': sorted(retry_after),
+        'broadcasts': server.room_registry.get('flood').ring.last_id,
+    }
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] == '--requests':
+        print(json.dumps(requests_run()))
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == '--flood':
+        print(json.dumps(flood_run()))
+        return
+
+    report = {'micro': micro()}
+    high = {'CLIENT_RATE_LIMIT': '1e9', 'CLIENT_RATE_BURST': '1000000000', 'ROOM_RATE_LIMIT': '1e9',
+            'ROOM_RATE_BURST': '1000000000', 'SEARCH_RATE_LIMIT': '1e9', 'SEARCH_RATE_BURST': '1000000000'}
+    for flag in ('0', '1'):
+        env = dict(os.environ, RATE_LIMIT_ENABLED=flag, COALESCE_WINDOW_MS='0', METRICS_ENABLED='0', **high)
+        output = subprocess.check_output(
+            [sys.executable, os.path.abspath(__file__), '--requests'], cwd=SERVER_DIR, env=env
+        )
+        report[f'rate_limit_enabled_{flag}'] = json.loads(output)
+    env = dict(os.environ, COALESCE_WINDOW_MS='0')
+    report['flood_default_limits'] = json.loads(subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), '--flood'], cwd=SERVER_DIR, env=env
+    ))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
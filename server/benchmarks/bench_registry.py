@@ -0,0 +1,210 @@
+"""Broadcast and join/leave throughput under churn, old room maps vs RoomRegistry.
+
+Broadcaster threads deliver frames to random rooms while churn threads
+join clients at a fixed rate across the same rooms, each leaving a little
+later, and one room is a hot room with thousands of listeners. Two implementations of the
+process-local room state are compared:
+
+  dicts     the old module-level maps: joins and broadcasts serialised on
+            the room's ring lock for the whole fan-out, leaves mutating
+            the subscriber dict with no lock at all
+  registry  RoomRegistry: sharded locks for joins and leaves, copy-on-write
+            subscriber snapshots iterated without a lock
+
+Reports broadcasts/s, joins/s, join latency percentiles (overall and for
+the hot room) and how many broadcasts failed with "dictionary changed size
+during iteration".
+
+    python benchmarks/bench_registry.py [--seconds 3] [--rooms 1000]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from collections import defaultdict, deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from registry import RoomRegistry  # noqa: E402
+from replay import EventRing  # noqa: E402
+from sse import encode_event  # noqa: E402
+from subscribers import DROP_OLDEST, BufferStats, ClientBuffer  # noqa: E402
+
+FRAME = encode_event({'type': 'music_state', 'data': {'track': 'u', 'isPlaying': True, 'currentTime': 1.0}}, 1)
+HOT_ROOM = 'room0'
+
+
+def new_buffer(stats):
+    return ClientBuffer(8, DROP_OLDEST, stats)
+
+
+class DictRooms:
+    # The maps app.py kept before RoomRegistry, with the same locking
+
+    def __init__(self):
+        self.queues = defaultdict(dict)
+        self.stats = defaultdict(BufferStats)
+        self.rings = defaultdict(lambda: EventRing(128))
+
+    def subscribe(self, room_id, client_id):
+        client_queue = new_buffer(self.stats[room_id])
+        ring = self.rings[room_id]
+        with ring.lock:
+            self.queues[room_id][client_id] = client_queue
+        return client_queue
+
+    def unsubscribe(self, room_id, client_id, client_queue):
+        client_queue.close()
+        subscribers = self.queues.get(room_id)
+        if subscribers is not None:
+            if subscribers.get(client_id) is client_queue:
+                del subscribers[client_id]
+            if not subscribers:
+                del self.queues[room_id]
+
+    def deliver(self, room_id, event_id):
+        ring = self.rings[room_id]
+        with ring.lock:
+            ring.append(event_id, FRAME)
+            if room_id in self.queues:
+                subscribers = self.queues[room_id]
+                dead_clients = []
+                for client_id, client_queue in subscribers.items():
+                    if not client_queue.put('music_state', FRAME):
+                        dead_clients.append(client_id)
+                for client_id in dead_clients:
+                    del subscribers[client_id]
+
+
+class RegistryRooms:
+    # The same operations through RoomRegistry, as app.py now does them
+
+    def __init__(self):
+        self.registry = RoomRegistry(ring_size=128)
+
+    def subscribe(self, room_id, client_id):
+        return self.registry.subscribe(room_id, client_id, new_buffer)[1]
+
+    def unsubscribe(self, room_id, client_id, client_queue):
+        client_queue.close()
+        self.registry.unsubscribe(room_id, client_id, client_queue)
+
+    def deliver(self, room_id, event_id):
+        local = self.registry.get_or_create(room_id)
+        dead_clients = []
+        with local.fanout_lock:
+            for client_id, client_queue in local.record(event_id, FRAME).items():
+                if not client_queue.put('music_state', FRAME):
+                    dead_clients.append((client_id, client_queue))
+        for client_id, client_queue in dead_clients:
+            self.registry.unsubscribe(local.room_id, client_id, client_queue)
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return round(values[min(len(values) - 1, int(len(values) * q))] * 1e6, 1)
+
+
+def run(rooms_impl, args):
+    rooms = [f'room{i}' for i in range(args.rooms)]
+    # Standing listeners: a hot room plus a few in every other room
+    for i in range(args.hot_listeners):
+        rooms_impl.subscribe(HOT_ROOM, f'hot{i}')
+    for room_id in rooms[1:]:
+        for i in range(args.listeners):
+            rooms_impl.subscribe(room_id, f'{room_id}-{i}')
+
+    stop = threading.Event()
+    counts = defaultdict(int)
+    errors = defaultdict(int)
+    join_latency, hot_join_latency = [], []
+
+    def broadcaster(seed):
+        rng = random.Random(seed)
+        event_id = 0
+        while not stop.is_set():
+            event_id += 1
+            # Every tenth broadcast goes to the hot room
+            room_id = HOT_ROOM if event_id % 10 == 0 else rng.choice(rooms)
+            try:
+                rooms_impl.deliver(room_id, event_id)
+                counts['broadcasts'] += 1
+            except RuntimeError as e:
+                errors[str(e)] += 1
+
+    def churn(seed):
+        # Paced, so both implementations see the same offered load
+        rng = random.Random(seed)
+        n = 0
+        interval = 1 / args.join_rate
+        next_join = time.perf_counter()
+        connected = deque()
+        while not stop.is_set():
+            next_join += interval
+            delay = next_join - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            n += 1
+            room_id = HOT_ROOM if n % 10 == 0 else rng.choice(rooms)
+            client_id = f'churn{seed}-{n}'
+            start = time.perf_counter()
+            client_queue = rooms_impl.subscribe(room_id, client_id)
+            elapsed = time.perf_counter() - start
+            (hot_join_latency if room_id == HOT_ROOM else join_latency).append(elapsed)
+            counts['joins'] += 1
+            # Each client stays for a while, so leaves land at any moment
+            # rather than straight after their own join
+            connected.append((room_id, client_id, client_queue))
+            if len(connected) > args.window:
+                rooms_impl.unsubscribe(*connected.popleft())
+
+    threads = [threading.Thread(target=broadcaster, args=(i,)) for i in range(args.broadcasters)]
+    threads += [threading.Thread(target=churn, args=(1000 + i,)) for i in range(args.churners)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return {
+        'broadcasts_per_s': round(counts['broadcasts'] / elapsed),
+        'joins_per_s': round(counts['joins'] / elapsed),
+        'join_p50_us': percentile(join_latency, 0.5),
+        'join_p99_us': percentile(join_latency, 0.99),
+        'hot_room_join_p50_us': percentile(hot_join_latency, 0.5),
+        'hot_room_join_p99_us': percentile(hot_join_latency, 0.99),
+        'broadcast_errors': dict(errors),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--rooms', type=int, default=1000)
+    parser.add_argument('--listeners', type=int, default=5, help='standing listeners per room')
+    parser.add_argument('--hot-listeners', type=int, default=5000)
+    parser.add_argument('--broadcasters', type=int, default=4)
+    parser.add_argument('--churners', type=int, default=4)
+    parser.add_argument('--join-rate', type=float, default=500, help='joins per second per churn thread')
+    parser.add_argument('--window', type=int, default=50, help='clients each churn thread keeps connected')
+    parser.add_argument('--switch-interval', type=float, default=0.0005, help='sys.setswitchinterval, seconds')
+    args = parser.parse_args()
+
+    # A short switch interval makes the GIL hand over mid-iteration the
+    # way it does under real load
+    sys.setswitchinterval(args.switch_interval)
+    report = {'config': vars(args)}
+    for name, impl in (('dicts', DictRooms), ('registry', RegistryRooms)):
+        report[name] = run(impl(), args)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
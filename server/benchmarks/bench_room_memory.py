@@ -0,0 +1,75 @@
+"""Memory per room and per listener at 100k rooms.
+
+Compares the old dict-per-room layout (with a users list) against the
+slotted Room/Listener model held by MemoryRoomStore.
+
+    python benchmarks/bench_room_memory.py --rooms 100000 --listeners 4
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import room_clock  # noqa: E402
+from models import new_listener_id  # noqa: E402
+from room_store import MemoryRoomStore  # noqa: E402
+
+
+def legacy_rooms(rooms, listeners):
+    store = {}
+    for i in range(rooms):
+        store[f'room-{i}'] = {
+            'track': '',
+            'isPlaying': False,
+            'currentTime': 0,
+            'users': [f'user-{i}-{j}' for j in range(listeners)],
+        }
+    return store
+
+
+def model_rooms(rooms, listeners):
+    store = MemoryRoomStore(lambda *m: None)
+    for i in range(rooms):
+        room_id = f'room-{i}'
+        store.create_room(room_id, dict(room_clock.anchor(0, False), track=''))
+        for j in range(listeners):
+            store.open_stream(room_id, new_listener_id(), f'user-{i}-{j}')
+    return store
+
+
+def measure(build, rooms, listeners):
+    gc.collect()
+    tracemalloc.start()
+    kept = build(rooms, listeners)
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return current
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rooms', type=int, default=100000)
+    parser.add_argument('--listeners', type=int, default=4)
+    args = parser.parse_args()
+
+    report = {'rooms': args.rooms, 'listeners_per_room': args.listeners}
+    for name, build in (('legacy_dict', legacy_rooms), ('slotted_model', model_rooms)):
+        empty = measure(build, args.rooms, 0)
+        full = measure(build, args.rooms, args.listeners)
+        report[name] = {
+            'total_mb': round(full / 2 ** 20, 2),
+            'bytes_per_room': round(empty / args.rooms, 1),
+            'bytes_per_listener': round((full - empty) / (args.rooms * args.listeners), 1)
+            if args.listeners else None,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
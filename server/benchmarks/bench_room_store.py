@@ -0,0 +1,102 @@
+"""Broadcast fan-out across worker processes through the Redis room store.
+
+Starts W worker processes, each holding L local subscribers for one room,
+publishes N frames from the parent and reports per-worker delivery rate.
+Uses REDIS_URL, or an in-process fakeredis TCP server with --fake-redis.
+
+    python benchmarks/bench_room_store.py --fake-redis --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from room_store import RedisRoomStore  # noqa: E402
+from sse import encode_event  # noqa: E402
+from subscribers import BufferStats, ClientBuffer  # noqa: E402
+
+
+def worker(redis_url, listeners, expected, ready, results):
+    stats = BufferStats()
+    buffers = [ClientBuffer(expected + 1, 'drop_oldest', stats) for _ in range(listeners)]
+    done = threading.Event()
+    received = [0, None]
+
+    def on_message(room_id, event_id, kind, frame):
+        if received[1] is None:
+            received[1] = time.perf_counter()
+        for client_buffer in buffers:
+            client_buffer.put(kind, frame)
+        received[0] += 1
+        if received[0] >= expected:
+            done.set()
+
+    store = RedisRoomStore(on_message, url=redis_url)
+    time.sleep(0.5)
+    ready.release()
+    done.wait(120)
+    elapsed = time.perf_counter() - (received[1] or time.perf_counter())
+    results.put({
+        'pid': os.getpid(),
+        'messages': received[0],
+        'frames_queued': stats.delivered,
+        'frames_per_sec': round(stats.delivered / elapsed, 1) if elapsed else None,
+    })
+    store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--listeners', type=int, default=500)
+    parser.add_argument('--messages', type=int, default=2000)
+    parser.add_argument('--fake-redis', action='store_true')
+    args = parser.parse_args()
+
+    redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    if args.fake_redis:
+        from fakeredis import TcpFakeServer
+        fake = TcpFakeServer(('127.0.0.1', 0), server_type='redis')
+        threading.Thread(target=fake.serve_forever, daemon=True).start()
+        redis_url = 'redis://%s:%d/0' % fake.server_address
+
+    ready = multiprocessing.Semaphore(0)
+    results = multiprocessing.Queue()
+    procs = [
+        multiprocessing.Process(target=worker, args=(redis_url, args.listeners, args.messages, ready, results))
+        for _ in range(args.workers)
+    ]
+    for proc in procs:
+        proc.start()
+    for _ in procs:
+        ready.acquire()
+
+    publisher = RedisRoomStore(lambda *m: None, url=redis_url)
+    publisher.create_room('bench', {})
+    frame = encode_event({'type': 'music_state', 'data': {'track': 'x', 'isPlaying': True, 'currentTime': 1}})
+    start = time.perf_counter()
+    for _ in range(args.messages):
+        publisher.publish_event('bench', 'music_state', frame)
+    publish_seconds = time.perf_counter() - start
+
+    workers = [results.get(timeout=180) for _ in procs]
+    for proc in procs:
+        proc.join()
+    publisher.close()
+    print(json.dumps({
+        'workers': args.workers,
+        'listeners_per_worker': args.listeners,
+        'messages': args.messages,
+        'publish_per_sec': round(args.messages / publish_seconds, 1),
+        'total_frames_per_sec': round(sum(w['frames_per_sec'] or 0 for w in workers), 1),
+        'per_worker': workers,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
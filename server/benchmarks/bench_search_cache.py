@@ -0,0 +1,62 @@
+"""/songs latency with the search cache against a local fake upstream.
+
+Fires bursts of concurrent identical queries (coalescing) and a skewed
+query mix (hit ratio), and reports upstream calls and cache stats.
+
+    python benchmarks/bench_search_cache.py
+"""
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_upstream import FakeUpstream  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def timed_get(client, query):
+    start = time.perf_counter()
+    resp = client.get('/songs', query_string={'query': query})
+    assert resp.status_code == 200, resp.data
+    return time.perf_counter() - start
+
+
+def main():
+    upstream = FakeUpstream(latency=0.05).start()
+    os.environ.update(SAAVN_SEARCH_URL=upstream.url, RATE_LIMIT_ENABLED='0', MAX_UPSTREAM_SEARCHES='0')
+    import app as server
+
+    client = server.app.test_client()
+    report = {}
+    with ThreadPoolExecutor(max_workers=50) as pool:
+        burst = list(pool.map(lambda _: timed_get(client, 'Stree2'), range(200)))
+    report['burst'] = {
+        'requests': len(burst),
+        'upstream_calls': upstream.requests,
+        'p50_ms': round(percentile(burst, 50) * 1000, 2),
+        'p99_ms': round(percentile(burst, 99) * 1000, 2),
+    }
+
+    queries = [f'song {int(random.paretovariate(1.2)) % 100}' for _ in range(2000)]
+    with ThreadPoolExecutor(max_workers=20) as pool:
+        mixed = list(pool.map(lambda q: timed_get(client, q), queries))
+    report['mixed'] = {
+        'requests': len(mixed),
+        'p50_ms': round(percentile(mixed, 50) * 1000, 2),
+        'p99_ms': round(percentile(mixed, 99) * 1000, 2),
+    }
+    report['cache'] = server.search_cache.stats()
+    upstream.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""/stream/<song_id> relay against a local fake audio origin.
+
+A room of listeners all start the same track at once; compares fetching it
+straight from the origin with going through the relay (origin requests,
+origin egress, wall time), then checks Range responses and LRU eviction
+under a small cache cap.
+
+    python benchmarks/bench_stream_relay.py --listeners 50 --size-mb 8
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_upstream import FakeUpstream, audio_body  # noqa: E402
+
+
+def fetch_all(session, url, listeners):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=listeners) as pool:
+        bodies = list(pool.map(lambda _: session.get(url).content, range(listeners)))
+    return time.perf_counter() - start, bodies
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listeners', type=int, default=50)
+    parser.add_argument('--size-mb', type=float, default=8)
+    args = parser.parse_args()
+
+    size = int(args.size_mb * 2 ** 20)
+    upstream = FakeUpstream(latency=0.05, audio_size=size).start()
+    cache_dir = tempfile.mkdtemp(prefix='stream-relay-bench-')
+    os.environ.update({
+        'SAAVN_SEARCH_URL': upstream.url,
+        'STREAM_RELAY': '1',
+        'STREAM_CACHE_DIR': cache_dir,
+        # Room for two tracks, so the third one evicts the least recent
+        'STREAM_CACHE_MAX_BYTES': str(size * 2 + 1),
+        'UPSTREAM_POOL_SIZE': str(args.listeners),
+    })
+    from werkzeug.serving import make_server
+    import app as server
+
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    httpd = make_server('127.0.0.1', 0, server.app, threaded=True)
+    ThreadPoolExecutor(max_workers=1).submit(httpd.serve_forever)
+    base = f'http://127.0.0.1:{httpd.server_port}'
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.listeners))
+
+    songs = session.get(f'{base}/songs', params={'query': 'Stree2'}).json()
+    song = songs[0]
+    expected = audio_body(urlparse(song['mp3_url']).path, size)
+    report = {'listeners': args.listeners, 'track_mb': args.size_mb}
+
+    before = upstream.audio_requests
+    elapsed, bodies = fetch_all(session, song['mp3_url'], args.listeners)
+    report['direct'] = {
+        'origin_requests': upstream.audio_requests - before,
+        'origin_mb': round((upstream.audio_requests - before) * size / 2 ** 20, 1),
+        'wall_s': round(elapsed, 3),
+        'bodies_ok': all(body == expected for body in bodies),
+    }
+
+    before = upstream.audio_requests
+    elapsed, bodies = fetch_all(session, base + song['stream_url'], args.listeners)
+    report['relay_cold'] = {
+        'origin_requests': upstream.audio_requests - before,
+        'origin_mb': round((upstream.audio_requests - before) * size / 2 ** 20, 1),
+        'wall_s': round(elapsed, 3),
+        'bodies_ok': all(body == expected for body in bodies),
+    }
+    elapsed, bodies = fetch_all(session, base + song['stream_url'], args.listeners)
+    report['relay_warm'] = {
+        'origin_requests': 0,
+        'wall_s': round(elapsed, 3),
+        'bodies_ok': all(body == expected for body in bodies),
+    }
+
+    resp = session.get(base + song['stream_url'], headers={'Range': 'bytes=1000-1999'})
+    etag = resp.headers.get('ETag')
+    report['range'] = {
+        'status': resp.status_code,
+        'content_range': resp.headers.get('Content-Range'),
+        'body_ok': resp.content == expected[1000:2000],
+        'not_modified': session.get(base + song['stream_url'], headers={'If-None-Match': etag}).status_code,
+    }
+
+    for other in songs[1:3]:
+        session.get(base + other['stream_url']).raise_for_status()
+    before = upstream.audio_requests
+    session.get(base + song['stream_url']).raise_for_status()
+    report['eviction'] = {
+        'refetched_evicted_track': upstream.audio_requests - before == 1,
+        'files_on_disk': len(os.listdir(cache_dir)),
+    }
+    report['cache'] = server.stream_cache.stats()
+
+    httpd.shutdown()
+    upstream.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""p50/p99 /songs latency through the pooled upstream client.
+
+Runs the app against a local fake upstream in three scenarios: healthy,
+degraded (latency jitter plus injected 503s) and an outage (upstream slower
+than the timeout), each with the pooled client and with a plain
+requests.get per search (the previous behaviour).
+Every query is unique so the search cache never answers.
+
+    python benchmarks/bench_upstream.py
+"""
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from fake_upstream import FakeUpstream  # noqa: E402
+
+os.environ.setdefault('UPSTREAM_TIMEOUT', '0.5')
+os.environ.setdefault('UPSTREAM_BREAKER_RESET', '60')
+os.environ.setdefault('RATE_LIMIT_ENABLED', '0')
+os.environ.setdefault('MAX_UPSTREAM_SEARCHES', '0')
+
+SCENARIOS = [
+    ('healthy', dict(latency=0.01)),
+    ('degraded', dict(latency=0.01, jitter=0.05, error_rate=0.2)),
+    ('outage', dict(latency=2.0)),
+]
+counter = itertools.count()
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def summarize(samples, statuses):
+    return {
+        'requests': len(samples),
+        'p50_ms': round(percentile(samples, 50) * 1000, 2),
+        'p99_ms': round(percentile(samples, 99) * 1000, 2),
+        'statuses': {str(k): statuses.count(k) for k in sorted(set(statuses), key=str)},
+    }
+
+
+def run_app(server, requests_per_scenario):
+    client = server.app.test_client()
+
+    def one(_):
+        start = time.perf_counter()
+        resp = client.get('/songs', query_string={'query': f'q{next(counter)}'})
+        return time.perf_counter() - start, resp.status_code
+
+    with ThreadPoolExecutor(max_workers=16) as pool:
+        results = list(pool.map(one, range(requests_per_scenario)))
+    return summarize([r[0] for r in results], [r[1] for r in results])
+
+
+class PlainClient:
+    def get(self, url, **kwargs):
+        kwargs.setdefault('timeout', float(os.environ['UPSTREAM_TIMEOUT']))
+        return requests.get(url, **kwargs)
+
+
+def main():
+    import app as server
+
+    pooled = server.upstream_client
+    report = {}
+    for name, options in SCENARIOS:
+        count = 64 if name == 'outage' else 400
+        upstream = FakeUpstream(**options).start()
+        server.saavn_search_url = upstream.url
+        server.upstream_client = PlainClient()
+        plain = run_app(server, count)
+        server.upstream_client = pooled
+        pooled.breaker.record_success()
+        report[name] = {
+            'plain_requests_get': plain,
+            'pooled_client': run_app(server, count),
+            'upstream': pooled.stats(),
+        }
+        upstream.stop()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Egress per listener-hour for each /events wire format.
+
+Builds an hour of room traffic (track changes with queue updates and
+next_track hints, play/pause and seeks, listeners coming and going,
+keepalives) and runs it through the same encoders /events uses:
+
+  json            shared JSON frames, as before
+  json+gzip       JSON through a per-stream gzip compressor
+  compact         short codes and interned track ids
+  compact+gzip    both
+  compact+deflate both, zlib framing
+
+Also reports the per-stream compression cost in microseconds per frame.
+
+    python benchmarks/bench_wire.py
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from sse import HEARTBEAT_FRAME, OPEN_FRAME, encode_event  # noqa: E402
+from wire import SCHEMA_FRAME, RoomEncoder, StreamEncoder  # noqa: E402
+
+MODES = [
+    ('json', False, None),
+    ('json+gzip', False, 'gzip'),
+    ('compact', True, None),
+    ('compact+gzip', True, 'gzip'),
+    ('compact+deflate', True, 'deflate'),
+]
+
+
+def track(i):
+    digest = hashlib.md5(str(i).encode()).hexdigest()
+    return f'https://aac.saavncdn.com/{100 + i % 900}/{digest}_320.mp4'
+
+
+def entry(i):
+    return {
+        'id': hashlib.md5(f'e{i}'.encode()).hexdigest()[:12], 'query': None, 'track': track(i),
+        'songId': f'{i:08d}', 'title': f'Song number {i}', 'artist': f'Artist {i % 17}, Artist {i % 5}',
+        'thumbnail': f'https://c.saavncdn.com/{i}/cover-500x500.jpg', 'duration': 180 + i % 90,
+    }
+
+
+def hour_of_traffic(seed=3):
+    # Messages with the second they are sent at, in order
+    rng = random.Random(seed)
+    events, now, song, server_time = [], 0.0, 0, 1.79e9
+    listeners = [f'listener{i}' for i in range(20)]
+    while now < 3600:
+        current = entry(song)
+        duration = current['duration']
+
+        def state(position, playing):
+            return {'type': 'music_state', 'data': {
+                'track': current['track'], 'title': current['title'], 'artist': current['artist'],
+                'duration': duration, 'isPlaying': playing, 'currentTime': round(position, 3),
+                'playbackRate': 1.0, 'serverTime': round(server_time + now, 3)}}
+
+        events.append((now, state(0, True)))
+        events.append((now, {'type': 'queue_updated', 'data': {'queue': [entry(song + i) for i in range(1, 6)]}}))
+        t = now + rng.uniform(20, 60)
+        while t < now + duration - 15:
+            # Someone pauses and resumes, or scrubs
+            events.append((t, state(t - now, rng.random() < 0.5)))
+            if rng.random() < 0.5:
+                who = rng.choice(listeners)
+                kind = rng.choice(['user_joined', 'user_left'])
+                events.append((t + 1, {'type': kind, 'data': {
+                    'listenerId': who, 'username': who.title(), 'count': rng.randint(5, 20)}}))
+            t += rng.uniform(30, 90)
+        events.append((now + duration - 15, {'type': 'next_track', 'data': dict(
+            entry(song + 1), startsAt=round(server_time + now + duration, 3))}))
+        now += duration
+        song += 1
+    events.sort(key=lambda item: item[0])
+    return events
+
+
+def frames_with_keepalives(events, interval=30):
+    # Heartbeat scheduler behaviour: a keepalive after `interval` idle seconds
+    frames, last = [], 0.0
+    for event_id, (at, message) in enumerate(events, 1):
+        while at - last > interval:
+            last += interval
+            frames.append(HEARTBEAT_FRAME)
+        frames.append(encode_event(message, event_id))
+        last = at
+    return frames
+
+
+def run(frames, compact, compression):
+    encoder = RoomEncoder() if compact else None
+    stream = StreamEncoder(compression) if compact or compression else None
+    room_frames = [encoder.encode(frame) for frame in frames] if encoder else frames
+    opening = [OPEN_FRAME, SCHEMA_FRAME] if compact else [OPEN_FRAME]
+    start = time.perf_counter()
+    total = 0
+    for frame in opening + room_frames:
+        total += len(frame if stream is None else stream.encode(frame))
+    elapsed = time.perf_counter() - start
+    return total, elapsed / (len(opening) + len(room_frames))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--listeners', type=int, default=1000,
+                        help='listeners to scale the per-listener numbers to')
+    args = parser.parse_args()
+
+    events = hour_of_traffic()
+    frames = frames_with_keepalives(events)
+    baseline = None
+    results = []
+    for name, compact, compression in MODES:
+        total, per_frame = run(frames, compact, compression)
+        baseline = baseline or total
+        results.append({
+            'mode': name,
+            'bytes_per_listener_hour': total,
+            'vs_json': round(total / baseline, 3),
+            'mb_per_hour_for_listeners': round(total * args.listeners / 2 ** 20, 1),
+            'us_per_frame_per_stream': round(per_frame * 1e6, 2),
+        })
+    print(json.dumps({
+        'frames_per_hour': len(frames),
+        'events_per_hour': len(events),
+        'listeners': args.listeners,
+        'results': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
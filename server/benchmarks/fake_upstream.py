@@ -0,0 +1,139 @@
+"""Local stand-in for the saavn.dev search API used by the benchmarks.
+
+Serves /api/search/songs with saavn-shaped payloads and can inject latency
+and errors. Point the app at it with SAAVN_SEARCH_URL. With audio_size set,
+download URLs point back at this server, which serves audio_size bytes of
+deterministic filler for them, standing in for the audio CDN.
+"""
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+BITRATES = ['12kbps', '48kbps', '96kbps', '160kbps', '320kbps']
+IMAGE_SIZES = ['50x50', '150x150', '500x500']
+
+
+def make_song(query, index, audio_base='https://aac.saavncdn.com'):
+    song_id = f'{abs(hash(query)) % 10 ** 8:08d}{index:02d}'
+    artist = {
+        'id': f'a{index}',
+        'name': f'Artist {index}',
+        'role': 'singer',
+        'type': 'artist',
+        'image': [
+            {'quality': size, 'url': f'https://c.saavncdn.com/artists/{index}_{size}.jpg'}
+            for size in IMAGE_SIZES
+        ],
+        'url': f'https://www.jiosaavn.com/artist/artist-{index}/{index}',
+    }
+    return {
+        'id': song_id,
+        'name': f'{query} {index}',
+        'type': 'song',
+        'year': '2024',
+        'releaseDate': '2024-08-15',
+        'duration': 180 + index,
+        'label': 'Fake Records',
+        'explicitContent': False,
+        'playCount': 1000000 + index,
+        'language': 'hindi',
+        'hasLyrics': False,
+        'lyricsId': None,
+        'url': f'https://www.jiosaavn.com/song/{song_id}',
+        'copyright': '(P) 2024 Fake Records',
+        'album': {'id': f'al{index}', 'name': f'{query} OST', 'url': 'https://www.jiosaavn.com/album/x'},
+        'artists': {'primary': [artist], 'featured': [], 'all': [artist, artist]},
+        'primaryArtists': artist['name'],
+        'image': [
+            {'quality': size, 'url': f'https://c.saavncdn.com/{song_id}_{size}.jpg'}
+            for size in IMAGE_SIZES
+        ],
+        'downloadUrl': [
+            {'quality': rate, 'url': f'{audio_base}/{song_id}_{rate}.mp4'}
+            for rate in BITRATES
+        ],
+    }
+
+
+def make_payload(query, results=10, **song_options):
+    return {
+        'success': True,
+        'data': {
+            'total': results,
+            'start': 0,
+            'results': [make_song(query, i, **song_options) for i in range(results)],
+        },
+    }
+
+
+def audio_body(path, size):
+    seed = path.encode()
+    return (seed * (size // len(seed) + 1))[:size]
+
+
+class FakeUpstream:
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, results=10, port=0, audio_size=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.results = results
+        self.audio_size = audio_size
+        self.requests = 0
+        self.audio_requests = 0
+        self._lock = threading.Lock()
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                with upstream._lock:
+                    upstream.requests += 1
+                delay = upstream.latency + random.uniform(0, upstream.jitter)
+                if delay:
+                    time.sleep(delay)
+                url = urlparse(self.path)
+                content_type = 'application/json'
+                if random.random() < upstream.error_rate:
+                    body = b'{"success": false}'
+                    self.send_response(503)
+                elif url.path.startswith('/audio/'):
+                    with upstream._lock:
+                        upstream.audio_requests += 1
+                    body = audio_body(url.path, upstream.audio_size)
+                    content_type = 'audio/mp4'
+                    self.send_response(200)
+                else:
+                    query = parse_qs(url.query).get('query', [''])[0]
+                    options = {'audio_base': upstream.audio_base} if upstream.audio_size else {}
+                    body = json.dumps(make_payload(query, upstream.results, **options)).encode()
+                    self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                try:
+                    self.wfile.write(body)
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client gave up (timeout) before the injected delay ended
+                    pass
+
+            def log_message(self, *args):
+                pass
+
+        ThreadingHTTPServer.request_queue_size = 128
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self.server.server_port}/api/search/songs'
+        self.audio_base = f'http://127.0.0.1:{self.server.server_port}/audio'
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,143 @@
+"""Concurrent SSE connection capacity and memory per connection.
+
+Starts the server in a subprocess (threaded Werkzeug or the gevent mode),
+opens N EventSource-style connections to one room and reports the server's
+RSS and thread count before and after.
+
+    python benchmarks/load_connections.py --mode threaded --connections 2000
+    python benchmarks/load_connections.py --mode gevent --connections 10000
+"""
+import argparse
+import json
+import os
+import resource
+import selectors
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+ENTRY_POINTS = {
+    'threaded': 'app.py',
+    'gevent': 'gevent_server.py',
+}
+
+
+def proc_status(pid):
+    status = {}
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            key, _, value = line.partition(':')
+            status[key] = value.strip()
+    return {
+        'rss_kb': int(status['VmRSS'].split()[0]),
+        'threads': int(status['Threads']),
+    }
+
+
+def wait_for_server(port, timeout=15):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError('server did not start')
+
+
+def post_json(port, path, body):
+    req = urllib.request.Request(
+        f'http://127.0.0.1:{port}{path}',
+        data=json.dumps(body).encode(),
+        headers={'Content-Type': 'application/json'}
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        return json.loads(resp.read())
+
+
+def open_listeners(port, room_id, count, timeout):
+    selector = selectors.DefaultSelector()
+    sockets = []
+    for i in range(count):
+        sock = socket.socket()
+        sock.settimeout(timeout)
+        sock.connect(('127.0.0.1', port))
+        sock.sendall(
+            f'GET /events?roomId={room_id}&clientId=load-{i} HTTP/1.1\r\n'
+            f'Host: 127.0.0.1\r\nAccept: text/event-stream\r\n\r\n'.encode()
+        )
+        sock.setblocking(False)
+        selector.register(sock, selectors.EVENT_READ)
+        sockets.append(sock)
+
+    # A listener counts as established once its response headers arrive
+    pending = set(sockets)
+    deadline = time.time() + timeout
+    while pending and time.time() < deadline:
+        for key, _ in selector.select(timeout=0.5):
+            try:
+                if key.fileobj.recv(4096):
+                    pending.discard(key.fileobj)
+            except BlockingIOError:
+                continue
+            selector.unregister(key.fileobj)
+    return sockets, count - len(pending)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=sorted(ENTRY_POINTS), default='threaded')
+    parser.add_argument('--connections', type=int, default=1000)
+    parser.add_argument('--port', type=int, default=10080)
+    parser.add_argument('--timeout', type=float, default=60)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    wanted = min(hard, args.connections * 2 + 256)
+    if soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+
+    env = dict(os.environ, PORT=str(args.port), RATE_LIMIT_ENABLED='0', MAX_SSE_CONNECTIONS='0')
+    server = subprocess.Popen(
+        [sys.executable, ENTRY_POINTS[args.mode]],
+        cwd=SERVER_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    sockets = []
+    try:
+        wait_for_server(args.port)
+        post_json(args.port, '/create-room', {'roomId': 'load', 'username': 'host'})
+        before = proc_status(server.pid)
+
+        start = time.perf_counter()
+        sockets, established = open_listeners(args.port, 'load', args.connections, args.timeout)
+        elapsed = time.perf_counter() - start
+        time.sleep(1)
+        after = proc_status(server.pid)
+
+        result = {
+            'mode': args.mode,
+            'requested': args.connections,
+            'established': established,
+            'open_seconds': round(elapsed, 3),
+            'rss_kb_before': before['rss_kb'],
+            'rss_kb_after': after['rss_kb'],
+            'threads_before': before['threads'],
+            'threads_after': after['threads'],
+            'kb_per_connection': round(
+                (after['rss_kb'] - before['rss_kb']) / max(established, 1), 2
+            ),
+        }
+        print(json.dumps(result, indent=2))
+    finally:
+        for sock in sockets:
+            sock.close()
+        server.terminate()
+        server.wait()
+
+
+if __name__ == '__main__':
+    main()
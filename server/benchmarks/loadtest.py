@@ -0,0 +1,272 @@
+"""End-to-end load test for rooms, broadcast fan-out and search.
+
+Starts the server in a subprocess (threaded Werkzeug or gevent) against a
+local fake upstream, connects many EventSource-style listeners across many
+rooms, replays a /set-music, /play-pause and /join-room traffic mix, then
+runs /songs. Delivery latency is measured from the moment a mutation is
+sent to the moment each listener receives the resulting frame. Results go
+to stdout (or --output) as JSON so runs can be diffed between releases.
+
+    python benchmarks/loadtest.py --mode gevent --rooms 50 --listeners 40
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import re
+import resource
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_upstream import FakeUpstream  # noqa: E402
+from load_connections import ENTRY_POINTS, SERVER_DIR, proc_status, wait_for_server  # noqa: E402
+
+FRAME = re.compile(rb'data: (\{.*?\})\n\n')
+
+
+def percentiles(samples):
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+
+    def at(pct):
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))] * 1000, 3)
+
+    return {'count': len(ordered), 'p50_ms': at(50), 'p90_ms': at(90), 'p99_ms': at(99),
+            'max_ms': round(ordered[-1] * 1000, 3)}
+
+
+class Listeners:
+    """Many SSE connections driven by one selector thread."""
+
+    def __init__(self, port):
+        self.port = port
+        self.selector = selectors.DefaultSelector()
+        self.buffers = {}
+        self.frames = 0
+        self.latencies = []
+        self.sent = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def connect(self, room_id, count):
+        for _ in range(count):
+            sock = socket.create_connection(('127.0.0.1', self.port))
+            sock.sendall(
+                f'GET /events?roomId={room_id} HTTP/1.1\r\nHost: 127.0.0.1\r\n'
+                f'Accept: text/event-stream\r\n\r\n'.encode()
+            )
+            sock.setblocking(False)
+            self.buffers[sock] = b''
+            self.selector.register(sock, selectors.EVENT_READ, room_id)
+
+    def expect(self, room_id, marker):
+        # Remember when the mutation carrying `marker` left the client
+        with self._lock:
+            self.sent[room_id, marker] = time.perf_counter()
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        for sock in list(self.buffers):
+            sock.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            for key, _ in self.selector.select(timeout=0.2):
+                try:
+                    data = key.fileobj.recv(65536)
+                except (BlockingIOError, ConnectionError):
+                    continue
+                now = time.perf_counter()
+                buffer = self.buffers[key.fileobj] + data
+                end = 0
+                for match in FRAME.finditer(buffer):
+                    end = match.end()
+                    self._record(key.data, match.group(1), now)
+                self.buffers[key.fileobj] = buffer[end:] if end else buffer[-65536:]
+
+    def _record(self, room_id, payload, now):
+        self.frames += 1
+        message = json.loads(payload)
+        if message.get('type') != 'music_state':
+            return
+        marker = message['data'].get('title')
+        with self._lock:
+            sent = self.sent.get((room_id, marker))
+        if sent is not None:
+            self.latencies.append(now - sent)
+
+
+class Client:
+    """Keep-alive JSON client, one per worker thread."""
+
+    def __init__(self, port):
+        self.port = port
+        self.local = threading.local()
+
+    def request(self, method, path, body=None):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=30)
+        payload = json.dumps(body) if body is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        try:
+            conn.request(method, path, body=payload, headers=headers)
+            response = conn.getresponse()
+            data = response.read()
+        except (http.client.HTTPException, OSError):
+            conn.close()
+            self.local.conn = None
+            raise
+        return response.status, data
+
+
+def replay_traffic(client, listeners, rooms, duration, rate, workers):
+    # Mutation mix: mostly play/pause, some track changes and joins. Every
+    # music_state carries a unique title so listeners can match it back.
+    counter = iter(range(10 ** 9))
+    latencies = {'set_music': [], 'play_pause': [], 'join_room': []}
+    errors = [0]
+
+    def one(room_id):
+        kind = random.choices(['play_pause', 'set_music', 'join_room'], [0.7, 0.2, 0.1])[0]
+        marker = f'm{next(counter)}'
+        start = time.perf_counter()
+        try:
+            if kind == 'join_room':
+                client.request('POST', '/join-room', {'roomId': room_id, 'username': marker})
+            else:
+                # Title is the marker; /play-pause keeps the room's title, so
+                # set it through /set-music first
+                listeners.expect(room_id, marker)
+                client.request('POST', '/set-music', {
+                    'roomId': room_id, 'track': f'https://cdn.example/{marker}.mp4',
+                    'title': marker, 'artist': 'load'
+                })
+                if kind == 'play_pause':
+                    client.request('POST', '/play-pause', {
+                        'roomId': room_id, 'isPlaying': True, 'currentTime': random.uniform(0, 200)
+                    })
+        except (http.client.HTTPException, OSError):
+            errors[0] += 1
+        latencies[kind].append(time.perf_counter() - start)
+
+    sent = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while time.perf_counter() - start < duration:
+            pool.submit(one, random.choice(rooms))
+            sent += 1
+            time.sleep(max(0.0, start + sent / rate - time.perf_counter()))
+    elapsed = time.perf_counter() - start
+    return {
+        'mutations': sent,
+        'mutations_per_sec': round(sent / elapsed, 1),
+        'errors': errors[0],
+        'request_latency': {kind: percentiles(samples) for kind, samples in latencies.items()},
+    }
+
+
+def run_search(client, requests, workers):
+    queries = [f'song {int(random.paretovariate(1.2)) % 200}' for _ in range(requests)]
+    latencies, statuses = [], {}
+
+    def one(query):
+        start = time.perf_counter()
+        status, _ = client.request('GET', f'/songs?query={query.replace(" ", "+")}')
+        latencies.append(time.perf_counter() - start)
+        statuses[status] = statuses.get(status, 0) + 1
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(one, queries))
+    return dict(percentiles(latencies), statuses={str(k): v for k, v in statuses.items()})
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--mode', choices=sorted(ENTRY_POINTS), default='threaded')
+    parser.add_argument('--rooms', type=int, default=20)
+    parser.add_argument('--listeners', type=int, default=25, help='per room')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--rate', type=float, default=50, help='mutations per second')
+    parser.add_argument('--workers', type=int, default=16)
+    parser.add_argument('--searches', type=int, default=500)
+    parser.add_argument('--port', type=int, default=10090)
+    parser.add_argument('--output')
+    args = parser.parse_args()
+
+    total = args.rooms * args.listeners
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < min(hard, total * 2 + 512):
+        resource.setrlimit(resource.RLIMIT_NOFILE, (min(hard, total * 2 + 512), hard))
+
+    upstream = FakeUpstream(latency=0.02, jitter=0.03, error_rate=0.01).start()
+    # Every simulated client shares one address, so per-client limits are off
+    env = dict(os.environ, PORT=str(args.port), SAAVN_SEARCH_URL=upstream.url,
+               MAX_CONNECTIONS=str(total + 1000), RATE_LIMIT_ENABLED='0',
+               MAX_SSE_CONNECTIONS='0', MAX_UPSTREAM_SEARCHES='0')
+    server = subprocess.Popen(
+        [sys.executable, ENTRY_POINTS[args.mode]], cwd=SERVER_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    listeners = None
+    try:
+        wait_for_server(args.port)
+        client = Client(args.port)
+        rooms = [f'load-{i}' for i in range(args.rooms)]
+        for room_id in rooms:
+            client.request('POST', '/create-room', {'roomId': room_id, 'username': 'host'})
+        idle = proc_status(server.pid)
+
+        listeners = Listeners(args.port)
+        listeners.start()
+        for room_id in rooms:
+            listeners.connect(room_id, args.listeners)
+        time.sleep(1)
+        connected = proc_status(server.pid)
+
+        traffic = replay_traffic(client, listeners, rooms, args.duration, args.rate, args.workers)
+        time.sleep(1)
+        loaded = proc_status(server.pid)
+        search = run_search(client, args.searches, args.workers)
+
+        report = {
+            'config': vars(args),
+            'server': {'idle': idle, 'connected': connected, 'after_traffic': loaded},
+            'traffic': traffic,
+            'delivery': dict(
+                percentiles(listeners.latencies),
+                frames_received=listeners.frames,
+                frames_per_sec=round(listeners.frames / args.duration, 1),
+            ),
+            'search': search,
+        }
+    finally:
+        if listeners is not None:
+            listeners.stop()
+        server.terminate()
+        server.wait()
+        upstream.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output + '\n')
+    print(output)
+
+
+if __name__ == '__main__':
+    main()
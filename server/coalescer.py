@@ -0,0 +1,132 @@
+import heapq
+import threading
+import time
+
+
+class StateCoalescer:
+    """Merges bursts of state broadcasts per room.
+
+    The first update after a quiet period goes out immediately; updates
+    arriving within `window` seconds of the last send are merged (latest wins)
+    and flushed when the window closes. flush_room() lets other message types
+    push out a pending state first so per-room ordering is preserved.
+
+    Sends run outside the lock, but at most one per room at a time: a window
+    that closes while a send is still in flight is flushed by that sender
+    right after it, so a slow send can never be overtaken by a newer state.
+    """
+
+    def __init__(self, window, send):
+        self.window = window
+        self.send = send
+        self.submitted = 0
+        self.sent = 0
+        self.merged = 0
+        # room_id -> pending message, or None while a window is open
+        self._rooms = {}
+        # Rooms with a send in flight, and those whose window closed meanwhile
+        self._sending = set()
+        self._due = set()
+        self._deadlines = []
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='state-coalescer', daemon=True)
+        self._thread.start()
+
+    def submit(self, room_id, message):
+        with self._cond:
+            self.submitted += 1
+            if room_id in self._rooms:
+                if self._rooms[room_id] is not None:
+                    self.merged += 1
+                self._rooms[room_id] = message
+                return
+            self._open_window(room_id)
+            self._sending.add(room_id)
+        self._send(room_id, message)
+
+    def flush_room(self, room_id):
+        # Returns once every state submitted for the room has been sent
+        with self._cond:
+            while room_id in self._sending:
+                self._cond.wait()
+            message = self._rooms.get(room_id)
+            if message is None:
+                return
+            self._rooms[room_id] = None
+            self._sending.add(room_id)
+        self._send(room_id, message)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._sending:
+                self._cond.wait()
+            pending = [(room_id, message) for room_id, message in self._rooms.items() if message is not None]
+            self._rooms.clear()
+            self._cond.notify_all()
+        for room_id, message in pending:
+            self.sent += 1
+            self.send(room_id, message)
+
+    def stats(self):
+        return {
+            'window_ms': self.window * 1000,
+            'submitted': self.submitted,
+            'sent': self.sent,
+            'merged': self.merged,
+            'open_windows': len(self._rooms),
+        }
+
+    def _open_window(self, room_id):
+        self._rooms[room_id] = None
+        heapq.heappush(self._deadlines, (time.monotonic() + self.window, room_id))
+        self._cond.notify()
+
+    def _send(self, room_id, message):
+        # room_id is marked as sending; sends message, then whatever fell
+        # due while it was in flight
+        try:
+            while message is not None:
+                self.send(room_id, message)
+                with self._cond:
+                    self.sent += 1
+                    message = None
+                    if room_id in self._due:
+                        self._due.discard(room_id)
+                        message = self._rooms.pop(room_id, None)
+                        if message is not None:
+                            self._open_window(room_id)
+        finally:
+            with self._cond:
+                self._sending.discard(room_id)
+                self._due.discard(room_id)
+                self._cond.notify_all()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if not self._deadlines:
+                    self._cond.wait()
+                    continue
+                deadline, room_id = self._deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._deadlines)
+                if room_id not in self._rooms:
+                    continue
+                if room_id in self._sending:
+                    # The sender in flight closes the window when it is done
+                    self._due.add(room_id)
+                    continue
+                message = self._rooms.pop(room_id)
+                if message is not None:
+                    # Keep the window open behind the flush we are about to send
+                    self._open_window(room_id)
+                    self._sending.add(room_id)
+            if message is not None:
+                self._send(room_id, message)
@@ -0,0 +1,25 @@
+# Event-loop server mode: every SSE listener is a greenlet instead of an OS
+# thread. Patching has to happen before app.py pulls in queue/threading/socket
+# so the blocking client_queue.get() in events() yields to the hub.
+from gevent import monkey
+
+monkey.patch_all()
+
+import os  # noqa: E402
+
+from gevent.pool import Pool  # noqa: E402
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+from app import app, port  # noqa: E402
+
+# Upper bound on concurrent connections (open EventSources included)
+max_connections = int(os.environ.get('MAX_CONNECTIONS', 50000))
+
+if __name__ == '__main__':
+    server = WSGIServer(
+        ('0.0.0.0', port),
+        app,
+        spawn=Pool(max_connections),
+        log=None
+    )
+    server.serve_forever()
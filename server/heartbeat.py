@@ -0,0 +1,67 @@
+import math
+import threading
+import time
+
+
+class HeartbeatScheduler:
+    """Keeps idle SSE streams alive from a single timer wheel.
+
+    Subscribers are spread across (interval / 2) / tick slots, so each
+    buffer is visited every half interval. A visit queues the shared
+    pre-encoded comment frame if the buffer has had nothing to send for
+    half an interval; an idle stream therefore never goes longer than
+    `interval` (give or take a tick) without a frame. The number of wakeups
+    per second is fixed no matter how many streams are open. Closed buffers
+    are dropped when their slot comes round.
+    """
+
+    def __init__(self, interval, tick, frame):
+        self.interval = interval
+        self.tick = tick
+        self.frame = frame
+        self.sent = 0
+        self.ticks = 0
+        self._slots = [set() for _ in range(max(1, math.ceil(interval / 2 / tick)))]
+        self._index = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='heartbeat', daemon=True)
+        self._thread.start()
+
+    def register(self, client_buffer):
+        with self._lock:
+            # The slot just behind the cursor comes round half an interval later
+            self._slots[self._index - 1].add(client_buffer)
+
+    def close(self):
+        self._stop.set()
+
+    def stats(self):
+        with self._lock:
+            tracked = sum(len(slot) for slot in self._slots)
+        return {
+            'interval': self.interval,
+            'tick': self.tick,
+            'slots': len(self._slots),
+            'tracked': tracked,
+            'ticks': self.ticks,
+            'sent': self.sent,
+        }
+
+    def _run(self):
+        while not self._stop.wait(self.tick):
+            with self._lock:
+                slot = self._slots[self._index]
+                self._index = (self._index + 1) % len(self._slots)
+                buffers = list(slot)
+            idle_since = time.monotonic() - self.interval / 2
+            closed = []
+            for client_buffer in buffers:
+                if client_buffer.closed:
+                    closed.append(client_buffer)
+                elif client_buffer.heartbeat(self.frame, idle_since):
+                    self.sent += 1
+            if closed:
+                with self._lock:
+                    slot.difference_update(closed)
+            self.ticks += 1
@@ -0,0 +1,101 @@
+import heapq
+import itertools
+import threading
+import time
+
+
+class LifecycleManager:
+    """Expires idle rooms and reaps stalled subscribers from one deadline heap.
+
+    Touching a room only updates its deadline in a dict; the heap entry is
+    checked lazily when it comes due and re-pushed if the room was touched
+    in the meantime, so activity is O(1) and each expiry is O(log n).
+    Subscribers are re-checked every `stall_timeout` seconds and reaped when
+    their buffer has frames that nobody has drained for that long, which is
+    what a client behind a dead or stuck socket looks like.
+    """
+
+    def __init__(self, room_ttl, stall_timeout, expire_room, reap_subscriber):
+        self.room_ttl = room_ttl
+        self.stall_timeout = stall_timeout
+        self.expire_room = expire_room
+        self.reap_subscriber = reap_subscriber
+        self.rooms_expired = 0
+        self.subscribers_reaped = 0
+        self._room_deadlines = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name='room-lifecycle', daemon=True)
+        self._thread.start()
+
+    def touch_room(self, room_id):
+        deadline = time.monotonic() + self.room_ttl
+        with self._cond:
+            known = room_id in self._room_deadlines
+            self._room_deadlines[room_id] = deadline
+            if not known:
+                self._push(deadline, 'room', room_id)
+
+    def watch_subscriber(self, room_id, client_id, client_queue):
+        with self._cond:
+            self._push(time.monotonic() + self.stall_timeout, 'subscriber', (room_id, client_id, client_queue))
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'room_ttl': self.room_ttl,
+                'stall_timeout': self.stall_timeout,
+                'tracked_rooms': len(self._room_deadlines),
+                'scheduled': len(self._heap),
+                'rooms_expired': self.rooms_expired,
+                'subscribers_reaped': self.subscribers_reaped,
+            }
+
+    def _push(self, deadline, kind, key):
+        heapq.heappush(self._heap, (deadline, next(self._seq), kind, key))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                now = time.monotonic()
+                deadline, _, kind, key = self._heap[0]
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+                heapq.heappop(self._heap)
+                if kind == 'room':
+                    current = self._room_deadlines.get(key)
+                    if current is None:
+                        continue
+                    if current > now:
+                        self._push(current, kind, key)
+                        continue
+                    del self._room_deadlines[key]
+            # Callbacks run outside the lock; they may touch rooms again
+            if kind == 'room':
+                if self.expire_room(key):
+                    self.rooms_expired += 1
+                else:
+                    self.touch_room(key)
+            else:
+                room_id, client_id, client_queue = key
+                if client_queue.closed:
+                    continue
+                if client_queue.stalled(now, self.stall_timeout):
+                    self.reap_subscriber(room_id, client_id, client_queue)
+                    self.subscribers_reaped += 1
+                else:
+                    self.watch_subscriber(room_id, client_id, client_queue)
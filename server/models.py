@@ -0,0 +1,84 @@
+import itertools
+import secrets
+
+
+def new_listener_id():
+    return secrets.token_urlsafe(9)
+
+
+class Listener:
+    __slots__ = ('listener_id', 'username')
+
+    def __init__(self, listener_id, username):
+        self.listener_id = listener_id
+        self.username = username
+
+    def as_dict(self):
+        return {'id': self.listener_id, 'username': self.username}
+
+
+class Room:
+    """In-memory room: playback state plus a listener index.
+
+    State goes in and out as the camelCase dicts used on the wire and in the
+    Redis store; listeners are keyed by id, in join order, for O(1) joins and
+    leaves and stable roster pages. The play queue is a list of entry dicts
+    that is replaced, never mutated, so state() snapshots stay valid.
+    """
+
+    __slots__ = (
+        'room_id', 'track', 'title', 'artist', 'duration', 'is_playing', 'current_time',
+        'anchor_time', 'playback_rate', 'queue', 'listeners', 'streams', 'event_seq'
+    )
+
+    # Wire/state key -> attribute
+    FIELDS = {
+        'track': 'track',
+        'title': 'title',
+        'artist': 'artist',
+        'duration': 'duration',
+        'isPlaying': 'is_playing',
+        'currentTime': 'current_time',
+        'anchorTime': 'anchor_time',
+        'playbackRate': 'playback_rate',
+        'queue': 'queue',
+    }
+
+    def __init__(self, room_id, state=None):
+        self.room_id = room_id
+        self.track = ''
+        self.title = None
+        self.artist = None
+        self.duration = None
+        self.is_playing = False
+        self.current_time = 0.0
+        self.anchor_time = 0.0
+        self.playback_rate = 1.0
+        self.queue = []
+        self.listeners = {}
+        # listener id -> open /events streams, across every worker
+        self.streams = {}
+        self.event_seq = 0
+        if state:
+            self.update(state)
+
+    def update(self, state):
+        for key, value in state.items():
+            setattr(self, self.FIELDS[key], value)
+
+    def state(self):
+        return {key: getattr(self, attr) for key, attr in self.FIELDS.items()}
+
+    def next_event_id(self):
+        self.event_seq += 1
+        return self.event_seq
+
+    def add_listener(self, listener):
+        self.listeners[listener.listener_id] = listener
+
+    def remove_listener(self, listener_id):
+        return self.listeners.pop(listener_id, None)
+
+    def roster(self, offset, limit):
+        page = itertools.islice(self.listeners.values(), offset, offset + limit)
+        return [listener.as_dict() for listener in page]
@@ -0,0 +1,120 @@
+import heapq
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import room_clock
+
+
+def playback_token(room):
+    # Identifies one uninterrupted stretch of playback; any set-music,
+    # play/pause, seek or advance changes the anchor and so the token
+    return room.get('track'), room.get('anchorTime')
+
+
+class PlaylistEngine:
+    """Auto-advances room queues on the room clock and prefetches ahead.
+
+    schedule() is called with a room's state whenever it changes. If the
+    room is playing a track of known duration, two deadlines are pushed on
+    a heap in server time: a prefetch `prefetch_lead` seconds before the
+    end, and the advance itself. Entries carry the playback token they were
+    computed from and are dropped when they come due under a different one,
+    so pausing, seeking or switching tracks needs no explicit cancel.
+    Both callbacks may hit the network, so the scheduler thread only hands
+    them to a pool of `workers` threads; a slow upstream delays that room,
+    not every other room's advance.
+    """
+
+    def __init__(self, prefetch_lead, advance, prefetch, workers=4):
+        self.prefetch_lead = prefetch_lead
+        self.advance = advance
+        self.prefetch = prefetch
+        self.workers = workers
+        self.advances = 0
+        self.prefetches = 0
+        self._tokens = {}
+        self._prefetch_pending = {}
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='playlist-worker')
+        self._thread = threading.Thread(target=self._run, name='playlist', daemon=True)
+        self._thread.start()
+
+    def schedule(self, room_id, room):
+        ends_at = room_clock.ends_at(room)
+        with self._cond:
+            if ends_at is None:
+                self._tokens.pop(room_id, None)
+                return
+            token = playback_token(room)
+            known = self._tokens.get(room_id) == token
+            self._tokens[room_id] = token
+            # Queue edits reschedule with the same token; one pending prefetch
+            # per stretch of playback is enough, it reads the queue when due
+            if room.get('queue') and self._prefetch_pending.get(room_id) != token:
+                self._prefetch_pending[room_id] = token
+                self._push(max(ends_at - self.prefetch_lead, room_clock.server_time()), 'prefetch', room_id, token)
+            if not known:
+                self._push(ends_at, 'advance', room_id, token)
+
+    def forget_room(self, room_id):
+        with self._cond:
+            self._tokens.pop(room_id, None)
+            self._prefetch_pending.pop(room_id, None)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._pool.shutdown(wait=False)
+
+    def stats(self):
+        with self._cond:
+            return {
+                'prefetch_lead': self.prefetch_lead,
+                'workers': self.workers,
+                'playing_rooms': len(self._tokens),
+                'scheduled': len(self._heap),
+                'advances': self.advances,
+                'prefetches': self.prefetches,
+            }
+
+    def _push(self, deadline, kind, room_id, token):
+        heapq.heappush(self._heap, (deadline, next(self._seq), kind, room_id, token))
+        self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._closed:
+                    return
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                now = room_clock.server_time()
+                deadline, _, kind, room_id, token = self._heap[0]
+                if deadline > now:
+                    self._cond.wait(deadline - now)
+                    continue
+                heapq.heappop(self._heap)
+                if kind == 'prefetch' and self._prefetch_pending.get(room_id) == token:
+                    del self._prefetch_pending[room_id]
+                if self._tokens.get(room_id) != token:
+                    continue
+                if kind == 'advance':
+                    del self._tokens[room_id]
+            # Callbacks run on the pool; an advance schedules the room again
+            self._pool.submit(self._callback, kind, room_id, token)
+
+    def _callback(self, kind, room_id, token):
+        if kind == 'advance':
+            if self.advance(room_id, token):
+                with self._cond:
+                    self.advances += 1
+        else:
+            with self._cond:
+                self.prefetches += 1
+            self.prefetch(room_id, token)
@@ -0,0 +1,69 @@
+import collections
+import sys
+import threading
+
+
+class SamplingProfiler:
+    """Statistical profiler that can be switched on and off at runtime.
+
+    A background thread snapshots every other thread's stack each
+    `interval` seconds and counts them in folded-stack form
+    ("outer;inner;leaf count"), ready for flamegraph tools. Under gevent
+    only the hub's OS thread is visible, so greenlet stacks are not split out.
+    """
+
+    def __init__(self, interval=0.01, max_depth=64):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = collections.Counter()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval=None):
+        if interval:
+            self.interval = interval
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=1)
+        self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def folded(self):
+        with self._lock:
+            return '\n'.join(f'{stack} {count}' for stack, count in self._stacks.most_common())
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            stacks = []
+            for thread_id, frame in frames.items():
+                if thread_id == own:
+                    continue
+                names = []
+                while frame is not None and len(names) < self.max_depth:
+                    code = frame.f_code
+                    names.append(f'{code.co_name} ({code.co_filename.rsplit("/", 1)[-1]})')
+                    frame = frame.f_back
+                stacks.append(';'.join(reversed(names)))
+            del frames
+            with self._lock:
+                self._stacks.update(stacks)
+                self.samples += 1
@@ -0,0 +1,89 @@
+import collections
+import math
+import threading
+import time
+
+
+class Overloaded(Exception):
+    """Raised when a node-wide concurrency limit turns work away."""
+
+    def __init__(self, retry_after):
+        super().__init__('Server is at capacity')
+        self.retry_after = retry_after
+
+
+def retry_after_header(seconds):
+    return {'Retry-After': str(max(1, math.ceil(seconds)))}
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets refilled lazily on access.
+
+    Keys are spread over lock-striped shards so concurrent requests for
+    different clients or rooms rarely contend, and each shard is an LRU
+    capped at max_keys / shards entries: an evicted key has been idle the
+    longest and would have refilled to a full bucket anyway. acquire() is
+    O(1). A rate of 0 disables the limiter.
+    """
+
+    def __init__(self, rate, burst, max_keys=100000, shards=16):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.rejected = 0
+        self._per_shard = max(1, max_keys // shards)
+        self._shards = [(threading.Lock(), collections.OrderedDict()) for _ in range(shards)]
+
+    def acquire(self, key, cost=1):
+        # Returns 0 if the request may go ahead, else seconds until it could
+        if self.rate <= 0:
+            return 0
+        lock, buckets = self._shards[hash(key) % len(self._shards)]
+        now = time.monotonic()
+        with lock:
+            bucket = buckets.get(key)
+            if bucket is None:
+                tokens = self.burst
+                if len(buckets) >= self._per_shard:
+                    buckets.popitem(last=False)
+            else:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                buckets.move_to_end(key)
+            if tokens >= cost:
+                buckets[key] = (tokens - cost, now)
+                return 0
+            buckets[key] = (tokens, now)
+            self.rejected += 1
+        return (cost - tokens) / self.rate
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'tracked_keys': sum(len(buckets) for _, buckets in self._shards),
+            'rejected': self.rejected,
+        }
+
+
+class ConcurrencyLimit:
+    """Counts work in progress against a node-wide cap (0 means no cap)."""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        with self._lock:
+            if self.limit and self.active >= self.limit:
+                self.rejected += 1
+                return False
+            self.active += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.active -= 1
+
+    def stats(self):
+        return {'limit': self.limit, 'active': self.active, 'rejected': self.rejected}
@@ -0,0 +1,153 @@
+import threading
+
+from replay import EventRing
+from subscribers import BufferStats
+from wire import RoomEncoder
+
+_EMPTY = {}
+
+
+def _add_stats(totals, stats):
+    for name in BufferStats.__slots__:
+        if name == 'max_depth':
+            totals.max_depth = max(totals.max_depth, stats.max_depth)
+        else:
+            setattr(totals, name, getattr(totals, name) + getattr(stats, name))
+
+
+class LocalRoom:
+    """This process's side of a room: its SSE subscribers, replay ring,
+    buffer stats and compact-format encoder.
+
+    `subscribers` is copy-on-write: it is never mutated, only replaced under
+    the registry shard lock, so a broadcast can iterate the dict it read
+    without holding any lock while subscribers come and go. `fanout_lock`
+    serialises broadcasts to the room so every subscriber sees frames in
+    event order; joins and leaves never take it.
+    """
+
+    __slots__ = ('room_id', 'subscribers', 'ring', 'stats', 'encoder', 'fanout_lock')
+
+    def __init__(self, room_id, ring_size, max_tracks):
+        self.room_id = room_id
+        self.subscribers = _EMPTY
+        self.ring = EventRing(ring_size)
+        self.stats = BufferStats()
+        self.encoder = RoomEncoder(max_tracks)
+        self.fanout_lock = threading.Lock()
+
+    def record(self, event_id, frame):
+        # Appending and taking the subscriber snapshot under the ring lock
+        # pairs with subscribe(): a frame is either in a new subscriber's
+        # replay or in its queue, never both and never neither
+        with self.ring.lock:
+            self.ring.append(event_id, frame)
+            return self.subscribers
+
+
+class RoomRegistry:
+    """Sharded, lock-striped map of room id -> LocalRoom.
+
+    Each room hashes to one of `shards` shards, each with its own lock, so
+    activity in different rooms rarely contends. Lookups are lock-free
+    dict reads; creating or dropping rooms and changing their subscriber
+    sets take the shard lock. Lock order is shard lock, then ring lock.
+    Buffer stats of dropped rooms are folded into `retired`, so node-wide
+    totals never go backwards.
+    """
+
+    def __init__(self, shards=64, ring_size=128, max_tracks=256):
+        self.ring_size = ring_size
+        self.max_tracks = max_tracks
+        self.retired = BufferStats()
+        self._retired_lock = threading.Lock()
+        self._shards = [(threading.Lock(), {}) for _ in range(shards)]
+
+    def _shard(self, room_id):
+        return self._shards[hash(room_id) % len(self._shards)]
+
+    def get(self, room_id):
+        return self._shard(room_id)[1].get(room_id)
+
+    def get_or_create(self, room_id):
+        lock, rooms = self._shard(room_id)
+        local = rooms.get(room_id)
+        if local is None:
+            with lock:
+                local = rooms.get(room_id)
+                if local is None:
+                    local = rooms[room_id] = LocalRoom(room_id, self.ring_size, self.max_tracks)
+        return local
+
+    def subscribe(self, room_id, client_id, new_buffer, last_event_id=None):
+        """Registers new_buffer(stats) as client_id's subscriber.
+
+        Returns (local room, buffer, missed frames or None, last event id).
+        A previous buffer for the same client id is closed and replaced.
+        """
+        lock, rooms = self._shard(room_id)
+        with lock:
+            local = rooms.get(room_id)
+            if local is None:
+                local = rooms[room_id] = LocalRoom(room_id, self.ring_size, self.max_tracks)
+            client_queue = new_buffer(local.stats)
+            with local.ring.lock:
+                subscribers = dict(local.subscribers)
+                previous = subscribers.get(client_id)
+                subscribers[client_id] = client_queue
+                local.subscribers = subscribers
+                missed = local.ring.since(last_event_id) if last_event_id is not None else None
+                resume_id = local.ring.last_id
+        if previous is not None:
+            previous.close()
+        return local, client_queue, missed, resume_id
+
+    def unsubscribe(self, room_id, client_id, client_queue):
+        # Only removes client_id if it still maps to this very buffer; a
+        # reconnect may already have replaced it
+        lock, rooms = self._shard(room_id)
+        with lock:
+            local = rooms.get(room_id)
+            if local is None or local.subscribers.get(client_id) is not client_queue:
+                return False
+            subscribers = dict(local.subscribers)
+            del subscribers[client_id]
+            local.subscribers = subscribers
+            return True
+
+    def discard(self, room_id):
+        # Drops the room's local state unless it still has subscribers
+        lock, rooms = self._shard(room_id)
+        with lock:
+            local = rooms.get(room_id)
+            if local is not None and local.subscribers:
+                return False
+            rooms.pop(room_id, None)
+        if local is not None:
+            with self._retired_lock:
+                _add_stats(self.retired, local.stats)
+        return True
+
+    def rooms(self):
+        result = []
+        for lock, rooms in self._shards:
+            with lock:
+                result.extend(rooms.values())
+        return result
+
+    def buffer_totals(self):
+        # BufferStats summed over every room this process has held
+        totals = BufferStats()
+        with self._retired_lock:
+            _add_stats(totals, self.retired)
+        for local in self.rooms():
+            _add_stats(totals, local.stats)
+        return totals
+
+    def stats(self):
+        local_rooms = self.rooms()
+        return {
+            'shards': len(self._shards),
+            'rooms': len(local_rooms),
+            'subscribers': sum(len(local.subscribers) for local in local_rooms),
+        }
@@ -0,0 +1,34 @@
+import collections
+import threading
+
+
+class EventRing:
+    """Fixed-size history of a room's encoded frames, by event id.
+
+    `lock` is held while a frame is recorded together with the subscriber
+    snapshot it will be fanned out to, and while a subscriber registers, so
+    a resuming client gets every frame exactly once: from the ring up to the
+    point it subscribed, from its queue after that.
+    """
+
+    __slots__ = ('lock', 'last_id', '_frames')
+
+    def __init__(self, size):
+        self.lock = threading.Lock()
+        self.last_id = 0
+        self._frames = collections.deque(maxlen=size)
+
+    def __len__(self):
+        return len(self._frames)
+
+    def append(self, event_id, frame):
+        self._frames.append((event_id, frame))
+        self.last_id = event_id
+
+    def since(self, last_id):
+        # Frames after last_id, or None if the gap is no longer covered
+        if last_id == self.last_id:
+            return []
+        if last_id > self.last_id or not self._frames or self._frames[0][0] > last_id + 1:
+            return None
+        return [frame for event_id, frame in self._frames if event_id > last_id]
@@ -0,0 +1,38 @@
+import time
+
+# Server clock used for room playback. It is driven by time.monotonic() so it
+# never jumps when the wall clock is adjusted, but offset to the epoch at
+# startup so timestamps are meaningful to clients and to other workers.
+_EPOCH_OFFSET = time.time() - time.monotonic()
+
+
+def server_time():
+    return time.monotonic() + _EPOCH_OFFSET
+
+
+def anchor(position, is_playing, rate=1.0, at=None):
+    # Room fields that pin playback to `position` seconds at server time `at`
+    return {
+        'isPlaying': bool(is_playing),
+        'currentTime': float(position),
+        'anchorTime': server_time() if at is None else at,
+        'playbackRate': float(rate),
+    }
+
+
+def position(room, at=None):
+    start = room.get('currentTime', 0)
+    if not room.get('isPlaying'):
+        return start
+    elapsed = (server_time() if at is None else at) - room.get('anchorTime', 0)
+    return start + max(elapsed, 0) * room.get('playbackRate', 1.0)
+
+
+def ends_at(room):
+    # Server time at which the current track runs out, or None if the room
+    # is paused or the track length is unknown
+    duration = room.get('duration')
+    if not room.get('isPlaying') or not duration or not room.get('playbackRate'):
+        return None
+    remaining = max(duration - room.get('currentTime', 0), 0)
+    return room.get('anchorTime', 0) + remaining / room['playbackRate']
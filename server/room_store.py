@@ -0,0 +1,302 @@
+import json
+import threading
+
+from models import Listener, Room
+from sse import with_event_id
+
+# Room state plus the pub/sub used to fan broadcasts out to every worker.
+# Each process keeps its own SSE subscribers; the store only has to get a
+# pre-encoded frame to every process that might hold listeners for the room.
+
+
+class MemoryRoomStore:
+    """Single-process store: Room objects in a dict, publish delivers inline."""
+
+    def __init__(self, on_message, publish_locks=64):
+        self.on_message = on_message
+        self.rooms = {}
+        self._lock = threading.Lock()
+        # Striped per room: held from allocating an event id until the frame
+        # has been delivered, so subscribers see a room's frames in id order
+        self._publish_locks = [threading.Lock() for _ in range(publish_locks)]
+
+    def create_room(self, room_id, state):
+        with self._lock:
+            if room_id in self.rooms:
+                return False
+            self.rooms[room_id] = Room(room_id, state)
+            return True
+
+    def get_room(self, room_id):
+        room = self.rooms.get(room_id)
+        return room.state() if room is not None else None
+
+    def room_exists(self, room_id):
+        return room_id in self.rooms
+
+    def touch_room(self, room_id, ttl):
+        # Expiry of in-memory rooms is driven by the lifecycle manager
+        pass
+
+    def delete_room(self, room_id):
+        with self._lock:
+            return self.rooms.pop(room_id, None) is not None
+
+    def update_room(self, room_id, fields):
+        return self.modify_room(room_id, lambda state: fields)
+
+    def modify_room(self, room_id, change):
+        # Atomic read-modify-write: change(state) returns the fields to set,
+        # or None to leave the room alone. Returns the new state or None.
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return None
+            fields = change(room.state())
+            if fields is None:
+                return None
+            room.update(fields)
+            return room.state()
+
+    def open_stream(self, room_id, listener_id, username):
+        # Counts an open /events stream. Returns the listener count if this
+        # added the listener to the roster, else None
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return None
+            room.streams[listener_id] = room.streams.get(listener_id, 0) + 1
+            if listener_id in room.listeners:
+                return None
+            room.add_listener(Listener(listener_id, username))
+            return len(room.listeners)
+
+    def close_stream(self, room_id, listener_id):
+        # Returns (username, remaining count) if this was the listener's last
+        # open stream and it left the roster, else None
+        with self._lock:
+            room = self.rooms.get(room_id)
+            if room is None:
+                return None
+            streams = room.streams.get(listener_id, 0) - 1
+            if streams > 0:
+                room.streams[listener_id] = streams
+                return None
+            room.streams.pop(listener_id, None)
+            listener = room.remove_listener(listener_id)
+            if listener is None:
+                return None
+            return listener.username, len(room.listeners)
+
+    def roster(self, room_id, offset, limit):
+        room = self.rooms.get(room_id)
+        if room is None:
+            return None
+        with self._lock:
+            return len(room.listeners), room.roster(offset, limit)
+
+    def publish_event(self, room_id, kind, frame):
+        # Stamps the room's next event id on an id-less frame and delivers
+        # it. Returns the id, or None if the room does not exist
+        with self._publish_locks[hash(room_id) % len(self._publish_locks)]:
+            with self._lock:
+                room = self.rooms.get(room_id)
+                if room is None:
+                    return None
+                event_id = room.next_event_id()
+            self.on_message(room_id, event_id, kind, with_event_id(frame, event_id))
+            return event_id
+
+    def close(self):
+        pass
+
+
+class RedisRoomStore:
+    """Multi-process store backed by Redis.
+
+    Room state is a JSON document per room; listeners are a hash of
+    id -> username plus a sorted set in join order for paging. Broadcasts go
+    through a PUBLISH on a per-room channel that every worker
+    pattern-subscribes to, so any worker can reach every listener.
+    """
+
+    KEY_PREFIX = 'room:'
+    CHANNEL_PREFIX = 'room-events:'
+
+    # Stream counts and the roster change together in one script, so a
+    # reconnect on one worker and the old stream closing on another can't
+    # interleave into a leave. Keys the room's TTL has not reached yet get it.
+    # KEYS: room, streams, listeners, order, seq; ARGV: listener id, username
+    OPEN_STREAM = """
+    local ttl = redis.call('PTTL', KEYS[1])
+    if ttl == -2 then
+        return false
+    end
+    redis.call('HINCRBY', KEYS[2], ARGV[1], 1)
+    local count = false
+    if redis.call('HEXISTS', KEYS[3], ARGV[1]) == 0 then
+        redis.call('HSET', KEYS[3], ARGV[1], ARGV[2])
+        redis.call('ZADD', KEYS[4], redis.call('INCR', KEYS[5]), ARGV[1])
+        count = redis.call('HLEN', KEYS[3])
+    end
+    if ttl > 0 then
+        for i = 2, 5 do
+            if redis.call('PTTL', KEYS[i]) == -1 then
+                redis.call('PEXPIRE', KEYS[i], ttl)
+            end
+        end
+    end
+    return count
+    """
+
+    # KEYS: streams, listeners, order; ARGV: listener id
+    CLOSE_STREAM = """
+    if redis.call('HINCRBY', KEYS[1], ARGV[1], -1) > 0 then
+        return false
+    end
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    local username = redis.call('HGET', KEYS[2], ARGV[1])
+    if not username then
+        return false
+    end
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    redis.call('ZREM', KEYS[3], ARGV[1])
+    return {username, redis.call('HLEN', KEYS[2])}
+    """
+
+    # Allocating the event id and publishing in one script keeps every
+    # worker's channel in id order. Nothing is created for a room that is
+    # gone, and a new counter key inherits the room's TTL.
+    # KEYS: room, event counter; ARGV: channel, kind, frame
+    PUBLISH_EVENT = """
+    local ttl = redis.call('PTTL', KEYS[1])
+    if ttl == -2 then
+        return false
+    end
+    local event_id = redis.call('INCR', KEYS[2])
+    if ttl > 0 and redis.call('PTTL', KEYS[2]) == -1 then
+        redis.call('PEXPIRE', KEYS[2], ttl)
+    end
+    redis.call('PUBLISH', ARGV[1], event_id .. '\\n' .. ARGV[2] .. '\\n' .. ARGV[3])
+    return event_id
+    """
+
+    def __init__(self, on_message, url='redis://localhost:6379/0', client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.on_message = on_message
+        self.client = client
+        self._publish_event = client.register_script(self.PUBLISH_EVENT)
+        self._open_stream = client.register_script(self.OPEN_STREAM)
+        self._close_stream = client.register_script(self.CLOSE_STREAM)
+        self._pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.psubscribe(**{self.CHANNEL_PREFIX + '*': self._handle})
+        self._listener = self._pubsub.run_in_thread(sleep_time=1.0, daemon=True)
+
+    def _key(self, room_id, suffix=''):
+        return self.KEY_PREFIX + room_id + suffix
+
+    def _handle(self, message):
+        room_id = message['channel'][len(self.CHANNEL_PREFIX):].decode('utf-8')
+        event_id, kind, frame = message['data'].split(b'\n', 2)
+        event_id = int(event_id)
+        self.on_message(room_id, event_id, kind.decode('utf-8'), with_event_id(frame, event_id))
+
+    def create_room(self, room_id, state):
+        return bool(self.client.set(self._key(room_id), json.dumps(Room(room_id, state).state()), nx=True))
+
+    def get_room(self, room_id):
+        raw = self.client.get(self._key(room_id))
+        return json.loads(raw) if raw is not None else None
+
+    def room_exists(self, room_id):
+        return bool(self.client.exists(self._key(room_id)))
+
+    def _room_keys(self, room_id):
+        return [self._key(room_id, suffix) for suffix in ('', ':listeners', ':order', ':seq', ':events', ':streams')]
+
+    def touch_room(self, room_id, ttl):
+        # Rooms are shared by every worker, so idle expiry is left to Redis:
+        # each bit of activity pushes the TTL of all the room's keys out
+        with self.client.pipeline(transaction=False) as pipe:
+            for key in self._room_keys(room_id):
+                pipe.expire(key, int(ttl))
+            pipe.execute()
+
+    def delete_room(self, room_id):
+        # Local state only; the keys expire on their own once idle everywhere
+        return True
+
+    def update_room(self, room_id, fields):
+        return self.modify_room(room_id, lambda state: fields)
+
+    def modify_room(self, room_id, change):
+        # change() may run more than once if another worker races us
+        key = self._key(room_id)
+
+        def apply(pipe):
+            raw = pipe.get(key)
+            if raw is None:
+                return None
+            room = json.loads(raw)
+            fields = change(room)
+            if fields is None:
+                return None
+            room.update(fields)
+            pipe.multi()
+            # The room's idle TTL stays on the key; only touch_room moves it
+            pipe.set(key, json.dumps(room), keepttl=True)
+            return room
+
+        return self.client.transaction(apply, key, value_from_callable=True)
+
+    def open_stream(self, room_id, listener_id, username):
+        return self._open_stream(
+            keys=[self._key(room_id, suffix) for suffix in ('', ':streams', ':listeners', ':order', ':seq')],
+            args=[listener_id, username]
+        )
+
+    def close_stream(self, room_id, listener_id):
+        removed = self._close_stream(
+            keys=[self._key(room_id, suffix) for suffix in (':streams', ':listeners', ':order')],
+            args=[listener_id]
+        )
+        if removed is None:
+            return None
+        username, count = removed
+        return username.decode('utf-8'), count
+
+    def roster(self, room_id, offset, limit):
+        if not self.room_exists(room_id):
+            return None
+        names, order = self._key(room_id, ':listeners'), self._key(room_id, ':order')
+        with self.client.pipeline() as pipe:
+            total, ids = pipe.hlen(names).zrange(order, offset, offset + limit - 1).execute()
+        usernames = self.client.hmget(names, ids) if ids else []
+        return total, [
+            {'id': listener_id.decode('utf-8'), 'username': username.decode('utf-8')}
+            for listener_id, username in zip(ids, usernames)
+            if username is not None
+        ]
+
+    def publish_event(self, room_id, kind, frame):
+        # Stamps the room's next event id on an id-less frame and publishes
+        # it to every worker. Returns the id, or None if the room does not exist
+        return self._publish_event(
+            keys=[self._key(room_id), self._key(room_id, ':events')],
+            args=[self.CHANNEL_PREFIX + room_id, kind or '', frame]
+        )
+
+    def close(self):
+        # The worker thread closes the pubsub connection on its way out
+        self._listener.stop()
+        self._listener.join(timeout=2)
+
+
+def create_room_store(backend, on_message, redis_url=None):
+    if backend == 'memory':
+        return MemoryRoomStore(on_message)
+    if backend == 'redis':
+        return RedisRoomStore(on_message, url=redis_url)
+    raise ValueError(f'Unknown room backend: {backend}')
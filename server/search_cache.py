@@ -0,0 +1,138 @@
+import collections
+import json
+import threading
+import time
+
+
+def normalize_query(query):
+    return ' '.join(query.lower().split())
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCache:
+    """TTL + LRU cache for upstream search results.
+
+    Concurrent lookups of the same key share one upstream call. Only list
+    results are cached; error dicts from fetch_song_data pass through.
+    Expired entries stay around until evicted so get_stale() can serve them
+    while the upstream is unavailable.
+    """
+
+    def __init__(self, maxsize=256, ttl=300, max_bytes=8 * 1024 * 1024):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries = collections.OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_hits = 0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.upstream_max_seconds = 0.0
+
+    def get_or_fetch(self, query, fetch):
+        key = normalize_query(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self.expirations += 1
+            self.misses += 1
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        start = time.perf_counter()
+        try:
+            flight.result = fetch(query)
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.upstream_calls += 1
+                self.upstream_seconds += elapsed
+                self.upstream_max_seconds = max(self.upstream_max_seconds, elapsed)
+                if isinstance(flight.result, list):
+                    self._store(key, flight.result)
+                del self._inflight[key]
+            flight.done.set()
+        return flight.result
+
+    def get_stale(self, query):
+        with self._lock:
+            entry = self._entries.get(normalize_query(query))
+            if entry is None:
+                return None
+            self.stale_hits += 1
+            return entry[2]
+
+    def _store(self, key, value):
+        size = len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._bytes += size
+        while len(self._entries) > self.maxsize or self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'stale_hits': self.stale_hits,
+                'inflight': len(self._inflight),
+                'upstream_calls': self.upstream_calls,
+                'upstream_avg_ms': round(
+                    self.upstream_seconds * 1000 / self.upstream_calls, 2
+                ) if self.upstream_calls else 0.0,
+                'upstream_max_ms': round(self.upstream_max_seconds * 1000, 2),
+            }
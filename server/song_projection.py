@@ -0,0 +1,89 @@
+import importlib.util
+import json
+
+RESULT = 'data.results.item'
+
+
+def _seconds(value):
+    # Track length arrives as an int or a numeric string depending on the API
+    try:
+        return int(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+
+class SongProjection:
+    """Builds the /songs result list straight from an upstream search payload.
+
+    By default the body is decoded in one go (C json is the fastest option)
+    and projected afterwards. With streaming=True and ijson installed it is
+    parsed incrementally instead, one result at a time, which keeps peak
+    memory flat regardless of payload size at a higher CPU cost. Download
+    and image URLs are chosen by preference order, falling back to the last
+    (highest quality) entry when none of the preferred ones are present.
+    """
+
+    def __init__(self, bitrates, image_sizes, streaming=False):
+        self.bitrates = {quality: rank for rank, quality in enumerate(bitrates)}
+        self.image_sizes = {quality: rank for rank, quality in enumerate(image_sizes)}
+        # ijson is optional and only imported by parse_stream, so a full
+        # json decode stays the fallback without loading it at startup
+        self.streaming = streaming and importlib.util.find_spec('ijson') is not None
+
+    def parse(self, response):
+        # Returns the projected songs, or None when the upstream reports failure
+        if self.streaming:
+            response.raw.decode_content = True
+            return self.parse_stream(response.raw)
+        return self.parse_bytes(response.content)
+
+    def parse_bytes(self, body):
+        data = json.loads(body)
+        if not data.get('success'):
+            return None
+        return [self.project(song) for song in data['data']['results']]
+
+    def project(self, song):
+        artist = song.get('primaryArtists')
+        if not artist:
+            primary = (song.get('artists') or {}).get('primary') or []
+            artist = ', '.join(a['name'] for a in primary if a.get('name'))
+        return {
+            'id': song.get('id'),
+            'title': song.get('name'),
+            'mp3_url': self._pick(song.get('downloadUrl'), self.bitrates),
+            'thumbnail_url': self._pick(song.get('image'), self.image_sizes),
+            'artist': artist or 'Unknown Artist',
+            'duration': _seconds(song.get('duration'))
+        }
+
+    def _pick(self, options, preferences):
+        if not options:
+            return None
+        best, best_rank = options[-1].get('url'), len(preferences)
+        for option in options:
+            rank = preferences.get(option.get('quality'), len(preferences))
+            if rank < best_rank:
+                best, best_rank = option.get('url'), rank
+        return best
+
+    def parse_stream(self, stream, chunk_size=16384):
+        # One incremental parser per path of interest, fed the same chunks;
+        # only one upstream song object is alive at a time
+        import ijson
+        results = ijson.sendable_list()
+        success = ijson.sendable_list()
+        parsers = (ijson.items_coro(results, RESULT), ijson.items_coro(success, 'success'))
+        songs = []
+        try:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                for parser in parsers:
+                    parser.send(chunk)
+                songs.extend(self.project(song) for song in results)
+                del results[:]
+            for parser in parsers:
+                parser.close()
+        except ijson.JSONError as e:
+            raise ValueError(str(e)) from e
+        songs.extend(self.project(song) for song in results)
+        return songs if success and success[0] else None
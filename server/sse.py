@@ -0,0 +1,33 @@
+import json
+
+# Server-Sent Events framing. Frames are encoded once into immutable bytes
+# so a broadcast can hand the same buffer to every subscriber in a room.
+
+
+def encode_event(message, event_id=None):
+    payload = json.dumps(message, separators=(',', ':'))
+    if event_id is None:
+        return f"data: {payload}\n\n".encode('utf-8')
+    # The id lets a reconnecting EventSource resume via Last-Event-ID
+    return f"id: {event_id}\ndata: {payload}\n\n".encode('utf-8')
+
+
+def with_event_id(frame, event_id):
+    # Same bytes as encode_event(message, event_id), given encode_event(message);
+    # room stores stamp the id on as they allocate it
+    return b'id: %d\n' % event_id + frame
+
+
+def parse_event_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+# Keepalive: a bare comment, pre-encoded once and shared by every stream
+HEARTBEAT_FRAME = b':\n\n'
+
+# Comment frame sent as soon as a stream opens so the response headers are
+# flushed right away; EventSource ignores comments.
+OPEN_FRAME = b': connected\n\n'
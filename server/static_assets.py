@@ -0,0 +1,50 @@
+import gzip
+import hashlib
+import threading
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+
+class StaticAsset:
+    """A file served from memory, precompressed, with a content-hash ETag.
+
+    Nothing is read until the first request for it, so cold starts and
+    workers that only serve the API or /events don't pay for loading and
+    compressing it. Variants are gzip, plus brotli when the brotli package
+    is installed. They all encode the same bytes, so one ETag (sent weak)
+    covers every variant.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.etag = None
+        self._variants = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._variants is not None:
+                return
+            with open(self.path, 'rb') as f:
+                body = f.read()
+            variants = []
+            if brotli is not None:
+                variants.append(('br', brotli.compress(body, mode=brotli.MODE_TEXT, quality=11)))
+            # mtime=0 keeps the bytes identical across processes and deploys
+            variants.append(('gzip', gzip.compress(body, compresslevel=9, mtime=0)))
+            variants.sort(key=lambda variant: len(variant[1]))
+            variants.append((None, body))
+            self.etag = hashlib.sha256(body).hexdigest()[:20]
+            self._variants = variants
+
+    def select(self, accepts):
+        # The smallest variant whose encoding accepts(encoding) allows, else
+        # the identity body. Returns (etag, encoding or None, body)
+        if self._variants is None:
+            self._load()
+        for encoding, body in self._variants:
+            if encoding is None or accepts(encoding):
+                return self.etag, encoding, body
@@ -0,0 +1,168 @@
+import collections
+import os
+import posixpath
+import re
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+SONG_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+PART_SUFFIX = '.part'
+
+
+class _Download:
+    __slots__ = ('done', 'path', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.path = None
+        self.error = None
+
+
+class StreamCache:
+    """Size-capped on-disk LRU of upstream audio files, keyed by song id.
+
+    Only song ids seen in our own search results can be relayed, so the
+    relay is not an open proxy. Concurrent misses for the same song share
+    one download, which is written to a temporary file and renamed into
+    place once complete. Files already on disk are picked up again at
+    startup, oldest first.
+    """
+
+    def __init__(self, directory, max_bytes=1024 * 1024 * 1024, max_urls=4096):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_urls = max_urls
+        self._urls = collections.OrderedDict()
+        self._files = collections.OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.downloads = 0
+        self.download_bytes = 0
+        self.download_seconds = 0.0
+        os.makedirs(directory, exist_ok=True)
+        self._load()
+
+    def _load(self):
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(PART_SUFFIX):
+                # Left behind by an interrupted download
+                os.unlink(path)
+                continue
+            song_id = os.path.splitext(name)[0]
+            if SONG_ID.match(song_id):
+                stat = os.stat(path)
+                found.append((stat.st_mtime, song_id, name, stat.st_size))
+        for _, song_id, name, size in sorted(found):
+            self._files[song_id] = (name, size)
+            self._bytes += size
+        self._evict()
+
+    def remember(self, songs):
+        # Record the upstream URL of every relayable song in a result list
+        with self._lock:
+            for song in songs:
+                song_id, url = song.get('id'), song.get('mp3_url')
+                if url and song_id and SONG_ID.match(song_id):
+                    self._urls[song_id] = url
+                    self._urls.move_to_end(song_id)
+            while len(self._urls) > self.max_urls:
+                self._urls.popitem(last=False)
+
+    def get_or_fetch(self, song_id, download):
+        """Returns the local path of the song, downloading it if needed.
+
+        download(url, fileobj) writes the upstream body into fileobj.
+        Raises KeyError for song ids we have no upstream URL for.
+        """
+        with self._lock:
+            entry = self._files.get(song_id)
+            if entry is not None:
+                self._files.move_to_end(song_id)
+                self.hits += 1
+                return os.path.join(self.directory, entry[0])
+            url = self._urls.get(song_id)
+            if url is None:
+                raise KeyError(song_id)
+            self.misses += 1
+            flight = self._inflight.get(song_id)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[song_id] = _Download()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.path
+
+        name = song_id + (posixpath.splitext(urlparse(url).path)[1] or '.mp3')
+        part = os.path.join(self.directory, f'{song_id}.{uuid.uuid4().hex}{PART_SUFFIX}')
+        start = time.perf_counter()
+        try:
+            with open(part, 'wb') as fileobj:
+                download(url, fileobj)
+                size = fileobj.tell()
+            flight.path = os.path.join(self.directory, name)
+            os.replace(part, flight.path)
+        except Exception as e:
+            flight.error = e
+            if os.path.exists(part):
+                os.unlink(part)
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self.downloads += 1
+                    self.download_bytes += size
+                    self.download_seconds += time.perf_counter() - start
+                    self._files[song_id] = (name, size)
+                    self._bytes += size
+                    self._evict(keep=song_id)
+                del self._inflight[song_id]
+            flight.done.set()
+        return flight.path
+
+    def _evict(self, keep=None):
+        # Files being served stay readable after unlink on POSIX
+        while self._bytes > self.max_bytes and self._files:
+            song_id = next(iter(self._files))
+            if song_id == keep:
+                if len(self._files) == 1:
+                    break
+                self._files.move_to_end(song_id)
+                continue
+            name, size = self._files.pop(song_id)
+            self._bytes -= size
+            self.evictions += 1
+            try:
+                os.unlink(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'files': len(self._files),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'known_songs': len(self._urls),
+                'inflight': len(self._inflight),
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'evictions': self.evictions,
+                'downloads': self.downloads,
+                'download_bytes': self.download_bytes,
+                'download_seconds': round(self.download_seconds, 3),
+            }
@@ -0,0 +1,115 @@
+import collections
+import threading
+import time
+
+# What to do when a subscriber's buffer is full
+DROP_OLDEST = 'drop_oldest'
+LATEST_STATE = 'latest_state'
+DISCONNECT = 'disconnect'
+POLICIES = (DROP_OLDEST, LATEST_STATE, DISCONNECT)
+
+# Only the newest of these is worth delivering to a client that is behind
+STATE_EVENTS = frozenset(['music_state'])
+
+
+class BufferStats:
+    __slots__ = ('delivered', 'drops', 'collapsed', 'evictions', 'max_depth', 'replayed', 'resyncs')
+
+    def __init__(self):
+        self.delivered = 0
+        self.drops = 0
+        self.collapsed = 0
+        self.evictions = 0
+        self.max_depth = 0
+        self.replayed = 0
+        self.resyncs = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class ClientBuffer:
+    """Bounded frame buffer for one SSE subscriber.
+
+    `compact` subscribers are fed the room's compact frames instead of the
+    JSON ones; see wire.py.
+    """
+
+    __slots__ = ('maxsize', 'policy', 'stats', 'compact', 'closed', 'last_drained', 'last_queued', '_items', '_cond')
+
+    def __init__(self, maxsize, policy, stats, compact=False):
+        if policy not in POLICIES:
+            raise ValueError(f'Unknown queue policy: {policy}')
+        self.maxsize = maxsize
+        self.policy = policy
+        self.stats = stats
+        self.compact = compact
+        self.closed = False
+        # Last time the consumer came back for more; a buffer with frames
+        # waiting and no recent drain belongs to a stalled or dead client
+        self.last_drained = time.monotonic()
+        self.last_queued = self.last_drained
+        self._items = collections.deque()
+        self._cond = threading.Condition(threading.Lock())
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, kind, frame):
+        # Returns False when the subscriber has been evicted
+        with self._cond:
+            if self.closed:
+                return False
+            items = self._items
+            if self.policy == LATEST_STATE and kind in STATE_EVENTS and items:
+                stale = [item for item in items if item[0] == kind]
+                for item in stale:
+                    items.remove(item)
+                self.stats.collapsed += len(stale)
+            if len(items) >= self.maxsize:
+                if self.policy == DISCONNECT:
+                    self.closed = True
+                    items.clear()
+                    self.stats.evictions += 1
+                    self._cond.notify()
+                    return False
+                items.popleft()
+                self.stats.drops += 1
+            items.append((kind, frame))
+            self.last_queued = time.monotonic()
+            if len(items) > self.stats.max_depth:
+                self.stats.max_depth = len(items)
+            self.stats.delivered += 1
+            self._cond.notify()
+            return True
+
+    def heartbeat(self, frame, idle_since):
+        # Queue a keepalive only if nothing has been sent since idle_since
+        if self.last_queued > idle_since:
+            return False
+        with self._cond:
+            if self.closed or self._items:
+                return False
+            self._items.append((None, frame))
+            self.last_queued = time.monotonic()
+            self._cond.notify()
+            return True
+
+    def get(self, timeout=None):
+        # Returns None on timeout or once the buffer is closed
+        self.last_drained = time.monotonic()
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            if self._items:
+                return self._items.popleft()[1]
+            return None
+
+    def stalled(self, now, timeout):
+        return bool(self._items) and now - self.last_drained > timeout
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self._items.clear()
+            self._cond.notify()
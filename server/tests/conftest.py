@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, SERVER_DIR)
+sys.path.insert(0, os.path.join(SERVER_DIR, 'benchmarks'))
+
+from fake_upstream import FakeUpstream  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def upstream():
+    # Search results link to audio on the same server
+    fake = FakeUpstream(audio_size=64 * 1024).start()
+    yield fake
+    fake.stop()
+
+
+@pytest.fixture(scope='session')
+def server(upstream, tmp_path_factory):
+    # app reads its configuration at import, so it is imported once, pointed
+    # at the fake upstream, with limits that would get in the way turned off
+    os.environ.update(
+        SAAVN_SEARCH_URL=upstream.url,
+        RATE_LIMIT_ENABLED='0',
+        MAX_UPSTREAM_SEARCHES='0',
+        COALESCE_WINDOW_MS='0',
+        UPSTREAM_RETRIES='0',
+        UPSTREAM_BREAKER_THRESHOLD='2',
+        STREAM_RELAY='1',
+        STREAM_CACHE_DIR=str(tmp_path_factory.mktemp('streams')),
+    )
+    import app
+    return app
+
+
+@pytest.fixture
+def client(server, upstream):
+    server.search_cache.clear()
+    server.upstream_client.breaker.record_success()
+    server.stream_client.breaker.record_success()
+    upstream.latency = 0.0
+    upstream.error_rate = 0.0
+    upstream.requests = 0
+    upstream.audio_requests = 0
+    return server.app.test_client()
@@ -0,0 +1,80 @@
+import pytest
+
+from room_store import RedisRoomStore
+from sse import encode_event
+
+fakeredis = pytest.importorskip('fakeredis')
+# The stores' Lua scripts need fakeredis' scripting support
+pytest.importorskip('lupa')
+
+TTL = 3600
+
+
+@pytest.fixture
+def redis_server():
+    return fakeredis.FakeServer()
+
+
+def new_store(redis_server):
+    return RedisRoomStore(lambda *args: None, client=fakeredis.FakeRedis(server=redis_server))
+
+
+@pytest.fixture
+def store(redis_server):
+    store = new_store(redis_server)
+    yield store
+    store.close()
+
+
+def assert_room_keys_expire(store, room_id):
+    for key in store._room_keys(room_id):
+        if store.client.exists(key):
+            assert 0 < store.client.ttl(key) <= TTL, key
+
+
+def test_every_room_key_keeps_the_idle_ttl(store):
+    assert store.create_room('r', {'track': ''})
+    store.touch_room('r', TTL)
+    assert_room_keys_expire(store, 'r')
+
+    assert store.open_stream('r', 'l1', 'alice') == 1
+    assert_room_keys_expire(store, 'r')
+
+    assert store.update_room('r', {'track': 'u', 'isPlaying': True})['track'] == 'u'
+    assert_room_keys_expire(store, 'r')
+
+    assert store.modify_room('r', lambda room: {'queue': [{'id': 'q1'}]})['queue'] == [{'id': 'q1'}]
+    assert_room_keys_expire(store, 'r')
+
+    assert store.publish_event('r', 'music_state', encode_event({'type': 'music_state'})) == 1
+    assert_room_keys_expire(store, 'r')
+    # Nothing was left out of the checks above
+    assert all(store.client.exists(key) for key in store._room_keys('r'))
+
+
+def test_nothing_is_created_for_a_missing_room(store):
+    assert store.open_stream('gone', 'l1', 'alice') is None
+    assert store.close_stream('gone', 'l1') is None
+    assert store.publish_event('gone', 'music_state', encode_event({'type': 'music_state'})) is None
+    assert store.update_room('gone', {'track': 'u'}) is None
+    assert store.client.keys('*') == []
+
+
+def test_roster_follows_open_streams_across_workers(store, redis_server):
+    # A second worker on the same Redis
+    other = new_store(redis_server)
+    try:
+        store.create_room('r', {'track': ''})
+        store.touch_room('r', TTL)
+        assert store.roster('r', 0, 10) == (0, [])
+
+        assert store.open_stream('r', 'l1', 'alice') == 1
+        # Reconnect on the other worker before the old stream has closed
+        assert other.open_stream('r', 'l1', 'alice') is None
+        assert store.close_stream('r', 'l1') is None
+        assert other.roster('r', 0, 10) == (1, [{'id': 'l1', 'username': 'alice'}])
+
+        assert other.close_stream('r', 'l1') == ('alice', 0)
+        assert store.roster('r', 0, 10) == (0, [])
+    finally:
+        other.close()
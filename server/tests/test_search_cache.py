@@ -0,0 +1,155 @@
+import threading
+import time
+
+import pytest
+
+from search_cache import SearchCache
+
+
+def counting_fetch(result=None):
+    calls = []
+
+    def fetch(query):
+        calls.append(query)
+        return [{'id': query}] if result is None else result
+    return fetch, calls
+
+
+def test_concurrent_identical_queries_share_one_upstream_call(client, upstream):
+    upstream.latency = 0.2
+    responses = [None] * 20
+
+    def search(i):
+        responses[i] = client.get('/songs', query_string={'query': 'Stree2'})
+
+    threads = [threading.Thread(target=search, args=(i,)) for i in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert upstream.requests == 1
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.data for response in responses}) == 1
+
+
+def test_queries_are_normalized(client, upstream):
+    assert client.get('/songs', query_string={'query': 'Stree2'}).status_code == 200
+    assert client.get('/songs', query_string={'query': '  STREE2 '}).status_code == 200
+    assert upstream.requests == 1
+
+
+def test_entries_expire_after_ttl():
+    cache = SearchCache(ttl=0.05)
+    fetch, calls = counting_fetch()
+    cache.get_or_fetch('a', fetch)
+    cache.get_or_fetch('a', fetch)
+    assert len(calls) == 1
+    time.sleep(0.1)
+    cache.get_or_fetch('a', fetch)
+    assert len(calls) == 2
+    assert cache.stats()['expirations'] == 1
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = SearchCache(maxsize=2)
+    fetch, calls = counting_fetch()
+    for query in ('a', 'b', 'a', 'c'):
+        cache.get_or_fetch(query, fetch)
+    assert calls == ['a', 'b', 'c']
+    cache.get_or_fetch('a', fetch)
+    assert calls == ['a', 'b', 'c']
+    cache.get_or_fetch('b', fetch)
+    assert calls == ['a', 'b', 'c', 'b']
+    assert cache.stats()['evictions'] == 2
+
+
+def test_byte_cap_evicts_and_skips_oversized_results():
+    # Each result encodes to 42 bytes
+    cache = SearchCache(maxsize=100, max_bytes=100)
+    fetch, calls = counting_fetch([{'id': 'x' * 31}])
+    for query in ('a', 'b', 'c'):
+        cache.get_or_fetch(query, fetch)
+    stats = cache.stats()
+    assert stats['entries'] == 2 and stats['bytes'] <= 100 and stats['evictions'] == 1
+    cache.get_or_fetch('a', fetch)
+    assert calls == ['a', 'b', 'c', 'a']
+
+    big, big_calls = counting_fetch([{'id': 'x' * 200}])
+    cache.get_or_fetch('big', big)
+    cache.get_or_fetch('big', big)
+    assert len(big_calls) == 2
+
+
+def test_error_results_are_not_cached():
+    cache = SearchCache()
+    fetch, calls = counting_fetch({'error': 'No results found'})
+    assert cache.get_or_fetch('a', fetch) == {'error': 'No results found'}
+    cache.get_or_fetch('a', fetch)
+    assert len(calls) == 2
+    assert cache.stats()['entries'] == 0
+
+
+def test_exceptions_reach_every_waiter_and_are_not_cached():
+    cache = SearchCache()
+    started = threading.Event()
+    calls = []
+
+    def failing(query):
+        calls.append(query)
+        started.set()
+        time.sleep(0.1)
+        raise ValueError('upstream broke')
+
+    errors = []
+
+    def search():
+        try:
+            cache.get_or_fetch('a', failing)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=search)
+    leader.start()
+    started.wait()
+    follower = threading.Thread(target=search)
+    follower.start()
+    leader.join()
+    follower.join()
+    assert len(calls) == 1 and len(errors) == 2
+
+    with pytest.raises(ValueError):
+        cache.get_or_fetch('a', failing)
+    assert len(calls) == 2
+
+
+def test_upstream_errors_are_not_cached(client, upstream):
+    upstream.error_rate = 1.0
+    assert client.get('/songs', query_string={'query': 'flaky'}).status_code == 400
+    upstream.error_rate = 0.0
+    assert client.get('/songs', query_string={'query': 'flaky'}).status_code == 200
+    assert upstream.requests == 2
+
+
+def test_stale_results_are_served_while_the_circuit_is_open(client, server, upstream, monkeypatch):
+    # Cached, but already expired
+    monkeypatch.setattr(server.search_cache, 'ttl', -1)
+    fresh = client.get('/songs', query_string={'query': 'Stree2'})
+    assert fresh.status_code == 200
+
+    upstream.error_rate = 1.0
+    for query in ('down1', 'down2'):
+        client.get('/songs', query_string={'query': query})
+    assert server.upstream_client.breaker.state == 'open'
+    requests_before = upstream.requests
+    stale_hits_before = server.search_cache.stale_hits
+
+    stale = client.get('/songs', query_string={'query': 'Stree2'})
+    assert stale.status_code == 200
+    assert stale.json == fresh.json
+    assert upstream.requests == requests_before
+    assert server.search_cache.stale_hits == stale_hits_before + 1
+
+    missing = client.get('/songs', query_string={'query': 'never searched'})
+    assert missing.status_code == 503
+    assert 'Retry-After' in missing.headers
@@ -0,0 +1,118 @@
+import os
+import threading
+from urllib.parse import urlparse
+
+import pytest
+
+from fake_upstream import audio_body
+from stream_cache import PART_SUFFIX, StreamCache
+
+
+def search(client, query):
+    response = client.get('/songs', query_string={'query': query})
+    assert response.status_code == 200
+    song = response.json[0]
+    return song['stream_url'], audio_body(urlparse(song['mp3_url']).path, 64 * 1024)
+
+
+def test_relays_the_upstream_audio(client, upstream):
+    url, expected = search(client, 'relay whole')
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.data == expected
+    assert upstream.audio_requests == 1
+
+    assert client.get(url).data == expected
+    assert upstream.audio_requests == 1
+
+
+def test_range_requests_get_partial_content(client):
+    url, expected = search(client, 'relay range')
+    response = client.get(url, headers={'Range': 'bytes=100-199'})
+    assert response.status_code == 206
+    assert response.data == expected[100:200]
+    assert response.headers['Content-Range'] == f'bytes 100-199/{len(expected)}'
+
+    tail = client.get(url, headers={'Range': 'bytes=-10'})
+    assert tail.status_code == 206
+    assert tail.data == expected[-10:]
+
+
+def test_conditional_requests_get_not_modified(client):
+    url, _ = search(client, 'relay conditional')
+    first = client.get(url)
+    assert first.headers['ETag']
+    response = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_concurrent_first_requests_share_one_download(client, upstream):
+    url, expected = search(client, 'relay concurrent')
+    upstream.latency = 0.2
+    bodies = [None] * 10
+
+    def fetch(i):
+        bodies[i] = client.get(url).data
+
+    threads = [threading.Thread(target=fetch, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert upstream.audio_requests == 1
+    assert all(body == expected for body in bodies)
+
+
+@pytest.mark.parametrize('song_id', ['never-searched', 'bad.id', 'x' * 65])
+def test_unknown_song_ids_are_not_found(client, song_id):
+    assert client.get(f'/stream/{song_id}').status_code == 404
+
+
+def writer(size):
+    calls = []
+
+    def download(url, fileobj):
+        calls.append(url)
+        fileobj.write(b'x' * size)
+    return download, calls
+
+
+def test_least_recently_used_files_are_evicted(tmp_path):
+    cache = StreamCache(str(tmp_path), max_bytes=250)
+    cache.remember([{'id': song_id, 'mp3_url': f'https://cdn/{song_id}.mp4'} for song_id in 'abc'])
+    download, calls = writer(100)
+    paths = {song_id: cache.get_or_fetch(song_id, download) for song_id in 'ab'}
+    cache.get_or_fetch('a', download)
+    cache.get_or_fetch('c', download)
+
+    assert not os.path.exists(paths['b'])
+    assert os.path.exists(paths['a'])
+    assert cache.stats()['evictions'] == 1 and cache.stats()['bytes'] == 200
+    cache.get_or_fetch('b', download)
+    assert len(calls) == 4
+
+
+def test_failed_downloads_leave_no_part_files(tmp_path):
+    cache = StreamCache(str(tmp_path))
+    cache.remember([{'id': 'a', 'mp3_url': 'https://cdn/a.mp4'}])
+
+    def broken(url, fileobj):
+        fileobj.write(b'half a song')
+        raise OSError('connection reset')
+
+    with pytest.raises(OSError):
+        cache.get_or_fetch('a', broken)
+    assert os.listdir(tmp_path) == []
+
+    download, calls = writer(10)
+    assert open(cache.get_or_fetch('a', download), 'rb').read() == b'x' * 10
+    assert len(calls) == 1
+
+
+def test_part_files_from_a_previous_run_are_removed(tmp_path):
+    (tmp_path / f'a.123{PART_SUFFIX}').write_bytes(b'partial')
+    (tmp_path / 'b.mp4').write_bytes(b'complete')
+    cache = StreamCache(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ['b.mp4']
+    assert cache.stats()['files'] == 1
@@ -0,0 +1,142 @@
+import random
+import threading
+import time
+
+RETRY_STATUSES = frozenset([429, 500, 502, 503, 504])
+
+
+def __getattr__(name):
+    # requests is imported on first use rather than at startup; it is the
+    # slowest import in the app. Callers catch upstream.RequestException
+    if name == 'RequestException':
+        from requests import RequestException
+        return RequestException
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, retry_after):
+        super().__init__('Upstream circuit is open')
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker with a single half-open probe."""
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+            self.rejected += 1
+            raise CircuitOpenError(max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self.state,
+                'consecutive_failures': self.failures,
+                'times_opened': self.times_opened,
+                'rejected': self.rejected,
+            }
+
+
+class UpstreamClient:
+    """Keep-alive HTTP client for the song API.
+
+    One pooled requests.Session shared by all workers, bounded retries with
+    full-jitter exponential backoff, and a circuit breaker so a struggling
+    upstream fails fast instead of pinning request threads. The session is
+    built on the first request.
+    """
+
+    def __init__(self, pool_size=20, retries=2, backoff=0.1, max_backoff=1.0,
+                 timeout=10.0, breaker=None):
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.breaker = breaker or CircuitBreaker()
+        self.pool_size = pool_size
+        self.retried = 0
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        if self._session is None:
+            with self._session_lock:
+                if self._session is None:
+                    import requests
+                    from requests.adapters import HTTPAdapter
+
+                    session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                    session.mount('http://', adapter)
+                    session.mount('https://', adapter)
+                    self._session = session
+        return self._session
+
+    def get(self, url, **kwargs):
+        self.breaker.before_call()
+        session = self.session
+        from requests import RequestException
+        kwargs.setdefault('timeout', self.timeout)
+        attempt = 0
+        while True:
+            try:
+                response = session.get(url, **kwargs)
+            except RequestException:
+                if attempt >= self.retries:
+                    self.breaker.record_failure()
+                    raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    self.breaker.record_success()
+                    return response
+                if attempt >= self.retries:
+                    self.breaker.record_failure()
+                    return response
+                response.close()
+            attempt += 1
+            self.retried += 1
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def stats(self):
+        return dict(self.breaker.stats(), retries=self.retried)
@@ -0,0 +1,155 @@
+import collections
+import json
+import threading
+import zlib
+
+from sse import encode_event
+
+# Compact event stream, negotiated per stream with ?format=compact.
+#
+# Keys and event types are replaced by short codes, and track URLs by small
+# per-room integer ids. The first frame a stream receives that mentions a
+# track it has not seen yet carries the definition inline under "df"; later
+# frames only carry the id. The stream opens with a schema frame mapping the
+# codes back to names, so clients never hard-code the tables.
+
+KEYS = {
+    'type': 't',
+    'data': 'd',
+    'track': 'k',
+    'title': 'n',
+    'artist': 'a',
+    'duration': 'u',
+    'isPlaying': 'p',
+    'currentTime': 'c',
+    'playbackRate': 'r',
+    'serverTime': 's',
+    'listenerId': 'l',
+    'username': 'un',
+    'count': 'cn',
+    'queue': 'q',
+    'id': 'i',
+    'query': 'qy',
+    'songId': 'sg',
+    'thumbnail': 'th',
+    'startsAt': 'sa',
+}
+TYPES = {
+    'music_state': 'm',
+    'user_joined': 'j',
+    'user_left': 'x',
+    'queue_updated': 'q',
+    'next_track': 'nt',
+}
+DEFINITIONS = 'df'
+
+SCHEMA_FRAME = encode_event({
+    't': 'w',
+    'keys': {code: name for name, code in KEYS.items()},
+    'types': {code: name for name, code in TYPES.items()},
+    'defs': DEFINITIONS,
+})
+
+# Per-stream compressors are long-lived, so they get a small window and
+# memLevel: ~32KB each instead of ~256KB with zlib's defaults. Frames are
+# short and repeat within a few KB, so the ratio barely changes.
+COMPRESSION_WBITS = {'gzip': 16 + 12, 'deflate': 12}
+COMPRESSION_MEMLEVEL = 5
+
+
+class CompactFrame:
+    """A compact frame that mentions tracks, in two pre-encoded variants:
+    with the track definitions inline and without."""
+
+    __slots__ = ('plain', 'defined', 'track_ids')
+
+    def __init__(self, plain, defined, track_ids):
+        self.plain = plain
+        self.defined = defined
+        self.track_ids = track_ids
+
+
+class RoomEncoder:
+    """Turns a room's encoded JSON frames into their compact form.
+
+    Called once per event for the whole room, so the compact variant is
+    shared by every compact subscriber just like the JSON one. Track ids
+    are interned in an LRU of `max_tracks` URLs; an evicted URL that comes
+    back simply gets a new id.
+    """
+
+    def __init__(self, max_tracks=256):
+        self.max_tracks = max_tracks
+        self._ids = collections.OrderedDict()
+        self._next_id = 1
+        self._lock = threading.Lock()
+
+    def encode(self, frame):
+        prefix, _, payload = frame.partition(b'data: ')
+        if not payload:
+            return frame
+        definitions = {}
+        with self._lock:
+            message = self._compact(json.loads(payload), definitions)
+        plain = prefix + b'data: ' + json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n\n'
+        if not definitions:
+            return plain
+        message[DEFINITIONS] = {str(track_id): url for track_id, url in definitions.items()}
+        defined = prefix + b'data: ' + json.dumps(message, separators=(',', ':')).encode('utf-8') + b'\n\n'
+        return CompactFrame(plain, defined, frozenset(definitions))
+
+    def _compact(self, value, definitions):
+        if isinstance(value, list):
+            return [self._compact(item, definitions) for item in value]
+        if not isinstance(value, dict):
+            return value
+        compact = {}
+        for key, item in value.items():
+            if key == 'track' and isinstance(item, str) and item:
+                item = self._intern(item)
+                definitions[item] = value[key]
+            elif key == 'type':
+                item = TYPES.get(item, item)
+            else:
+                item = self._compact(item, definitions)
+            compact[KEYS.get(key, key)] = item
+        return compact
+
+    def _intern(self, url):
+        track_id = self._ids.get(url)
+        if track_id is None:
+            track_id = self._ids[url] = self._next_id
+            self._next_id += 1
+            if len(self._ids) > self.max_tracks:
+                self._ids.popitem(last=False)
+        else:
+            self._ids.move_to_end(url)
+        return track_id
+
+
+class StreamEncoder:
+    """Per-stream end of the wire format: picks the compact variant the
+    stream needs and runs everything through the stream's compressor."""
+
+    __slots__ = ('known_tracks', '_compressor')
+
+    def __init__(self, compression=None):
+        self.known_tracks = set()
+        self._compressor = None
+        if compression is not None:
+            self._compressor = zlib.compressobj(
+                6, zlib.DEFLATED, COMPRESSION_WBITS[compression], COMPRESSION_MEMLEVEL
+            )
+
+    def encode(self, item):
+        if isinstance(item, CompactFrame):
+            if item.track_ids <= self.known_tracks:
+                item = item.plain
+            else:
+                self.known_tracks |= item.track_ids
+                item = item.defined
+        if self._compressor is not None:
+            # Sync flush: every frame reaches the client now, while the
+            # dictionary carries over to the next one
+            return self._compressor.compress(item) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return item